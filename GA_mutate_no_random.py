@@ -1,157 +1,325 @@
 from policy import Policy
+from background import BackgroundPlanner
+from chromosome import (
+    block_size, crossover, iter_actions, make_chromosome, oriented, to_action, to_actions,
+)
+from fit_table import FitTable
+from fitness_cache import FitnessCache, chromosome_key
+from ga_fitness import PopulationScorer
+from pattern_library import PatternLibrary, PatternReplay
+from placement import first_free_position
+from plan import CuttingPlan, expand_demand, feasible_blocks, feasible_sequence
+from stats import PolicyStats
+from stock_index import OccupancyIndex
 import numpy as np
 import random
+import time
 
 class Policy2210xxx(Policy):
-    def __init__(self, policy_id=1):
+    def __init__(self, policy_id=1, plan_mode=False, time_budget_ms=None, plateau_generations=None,
+                 fitness_cache_size=4096, rotation=True, seed_fraction=0.0, stats=False, stats_log=None, block_mode=False,
+                 background=False, background_horizon=None,
+                 pattern_library=None, pattern_library_size=1024):
         """
         Initializes the custom policy with a specific ID.
+        With plan_mode, one GA run plans the remaining demand and later calls replay it.
+        time_budget_ms and plateau_generations make get_action anytime: the GA stops
+        when the budget is spent or the best fitness stalls, whichever comes first.
+        Fitness values are memoized in an LRU cache of fitness_cache_size chromosomes.
+        With rotation, every gene carries an orientation and pieces may be placed rotated.
+        seed_fraction of the initial population is built by a randomized bottom-left
+        fill instead of random positions; the rest stays random for diversity.
+        stats turns on the counters and phase timers of self.stats; with stats_log,
+        the stats of every episode are appended to that file as a JSON line.
+        With block_mode, a gene is a run-length block of one product type, up to its
+        whole quantity cut as an N-up grid; the best solution is planned block by
+        block and decoded into single actions only as they are handed out.
+        With background, a worker thread keeps running the GA ahead of the environment
+        (up to background_horizon actions per state) and get_action serves its
+        actions while they stay valid; see background.BackgroundPlanner.
+        With pattern_library, the path of a JSON file, whole-stock cutting patterns
+        are remembered across episodes and replayed before searching when an uncut
+        stock and the remaining demand match one; the file keeps at most
+        pattern_library_size patterns, dropping the least recently used.
         """
         assert policy_id in [1, 2], "Policy ID must be 1 or 2"
         self.policy_id = policy_id
+        self._index = OccupancyIndex()  # Per-stock sizes and areas kept across calls
+        self._fits = FitTable()  # Product x stock x orientation fit flags of the episode
+        self.plan_mode = plan_mode
+        self._plan = CuttingPlan()
+        self._scorer = None
+        self._first_fits = {}  # (stock_idx, prod_w, prod_h) -> first free position on the current stocks
+
+        self.time_budget_ms = time_budget_ms
+        self.plateau_generations = plateau_generations
+        self.fitness_cache = FitnessCache(fitness_cache_size)
+        self.rotation = rotation
+        self.seed_fraction = seed_fraction
+        self.stats = PolicyStats(stats, stats_log)
+        self.block_mode = block_mode
+        self._patterns = None
+        if pattern_library is not None:
+            self._patterns = PatternReplay(PatternLibrary(pattern_library, pattern_library_size), self._index)
+        self._background = None
+        if background:
+            self._background = BackgroundPlanner(self, self._lookup_or_solve, background_horizon)
 
     def get_action(self, observation, info):
         """
         Implements a Genetic Algorithm (GA) based policy to minimize trim loss.
         """
+        if self._background is not None:
+            return self._background.get_action(observation, info)
+        return self._lookup_or_solve(observation, info)
+
+    def _lookup_or_solve(self, observation, info):
+        """Replay a stored pattern if one matches, else solve."""
+        if self._patterns is None:
+            return self._solve(observation, info)
+        return self._patterns.get_action(observation, info, self._solve)
+
+    def _solve(self, observation, info):
+        """One synchronous GA run on the observation."""
         population_size = 100  # Increased population size
         generations = 100  # Increased number of generations
         mutation_rate = 0.1  # Adjusted mutation rate
 
+        deadline = None
+        if self.time_budget_ms is not None:
+            deadline = time.perf_counter() + self.time_budget_ms / 1000
+
+        tick = time.perf_counter()
         stocks = observation["stocks"]
+        self._index.sync(stocks, observation["products"])
+        self._fits.sync(observation["products"], self._index)
+        if self._scorer is None or self._scorer.version != self._index.version:
+            self._scorer = PopulationScorer(self._index)
+            self.fitness_cache.clear()  # Cached scores were computed on the old stocks
+            self._first_fits.clear()
+        self.stats.start_call(self._index.episode)
+        self.stats.add_time("init", time.perf_counter() - tick)
+
+        # Replay the cached plan while the environment follows it
+        if self.plan_mode or self.block_mode:
+            action = self._plan.next_action(observation["products"], self._index)
+            if action is not None:
+                self.stats.count("plan_replays")
+                return action
+
         products = sorted(
             observation["products"],
             key=lambda p: (p["size"][0] * p["size"][1], p["quantity"]),
             reverse=True
         )
 
-        # Initial population: Random solutions
-        population = [self._generate_random_solution(products, stocks) for _ in range(population_size)]
+        # When planning, every remaining piece gets its own gene, unless blocks carry the counts
+        demand = expand_demand(products) if self.plan_mode and not self.block_mode else products
+
+        # Initial population: bottom-left seeds, then random solutions
+        with self.stats.phase("init"):
+            population = self._initial_population(demand, stocks, population_size)
+
+        population = self._evolve(population, products, stocks, generations, mutation_rate, deadline)
+
+        with self.stats.phase("final_pick"):
+            # Choose the best solution from the final generation
+            best_solution = population[int(np.argmin(self._evaluate_population(population, stocks)))]
+
+            # Keep the whole feasible part of the best solution as the plan
+            if self.block_mode:
+                blocks = feasible_blocks(best_solution, products, self._index)
+                self._plan.load(iter_actions(blocks), self._index)
+            elif self.plan_mode:
+                self._plan.load(feasible_sequence(to_actions(best_solution), products, self._index), self._index)
+            if self.plan_mode or self.block_mode:
+                action = self._plan.next_action(observation["products"], self._index)
+                if action is not None:
+                    return action
+
+            # Return the first valid action from the best solution
+            for action in iter_actions(best_solution):
+                if self._is_action_valid(action, products, stocks):
+                    return action
 
+            # Fallback: return a random action if no valid solution is found
+            return to_action(self._generate_random_solution(products, stocks)[0])
+
+    def _evolve(self, population, products, stocks, generations, mutation_rate, deadline=None):
+        """
+        Run the generation loop on a population and return the last generation.
+        Stops early at the deadline (a time.perf_counter() value) or when the best
+        fitness has not improved for plateau_generations generations.
+        """
+        population_size = len(population)
+        best_fitness = float("inf")
+        stalled = 0
         for generation in range(generations):
             # Evaluate fitness
-            fitness_scores = [self._evaluate_fitness(solution, stocks) for solution in population]
+            self.stats.count("generations")
+            with self.stats.phase("evaluate"):
+                fitness_scores = self._evaluate_population(population, stocks)
+
+            # Anytime stop: the population is scored, so its best is ready to use
+            if fitness_scores.min() < best_fitness:
+                best_fitness = fitness_scores.min()
+                stalled = 0
+            else:
+                stalled += 1
+            if self.plateau_generations is not None and stalled >= self.plateau_generations:
+                break
+            if deadline is not None and time.perf_counter() >= deadline:
+                break
 
             # Selection: Select the top solutions
-            selected_indices = np.argsort(fitness_scores)[:population_size // 2]
-            selected_population = [population[i] for i in selected_indices]
+            with self.stats.phase("select"):
+                selected_indices = np.argsort(fitness_scores)[:population_size // 2]
+                selected_population = [population[i] for i in selected_indices]
 
             # Crossover: Create offspring by combining parents
             offspring = []
-            while len(offspring) < population_size - len(selected_population):
-                parent1, parent2 = random.sample(selected_population, 2)
-                child = self._crossover(parent1, parent2)
-                offspring.append(child)
+            with self.stats.phase("crossover"):
+                while len(offspring) < population_size - len(selected_population):
+                    parent1, parent2 = random.sample(selected_population, 2)
+                    child = self._crossover(parent1, parent2)
+                    offspring.append(child)
+            self.stats.count("crossovers", len(offspring))
 
             # Mutation: Randomly mutate offspring
-            for child in offspring:
-                if random.random() < mutation_rate:
-                    self._mutate(child, products, stocks)
+            with self.stats.phase("mutate"):
+                for child in offspring:
+                    if random.random() < mutation_rate:
+                        self.stats.count("mutations")
+                        self._mutate(child, products, stocks)
 
             # Update population
             population = selected_population + offspring
-
-        # Choose the best solution from the final generation
-        best_solution = min(population, key=lambda sol: self._evaluate_fitness(sol, stocks))
-
-        # Return the first valid action from the best solution
-        for action in best_solution:
-            if self._is_action_valid(action, products, stocks):
-                return action
-
-        # Fallback: return a random action if no valid solution is found
-        return self._generate_random_solution(products, stocks)[0]
+        return population
+
+    def close(self):
+        """Stop the background planner, save the pattern library and log the last episode's stats."""
+        if self._background is not None:
+            self._background.close()
+        if self._patterns is not None:
+            self._patterns.flush()
+        self.stats.end_episode()
+
+    def _initial_population(self, products, stocks, population_size):
+        """seed_fraction bottom-left solutions followed by random ones."""
+        n_seeded = int(round(self.seed_fraction * population_size))
+        return (
+            [self._generate_seeded_solution(products, stocks) for _ in range(n_seeded)]
+            + [self._generate_random_solution(products, stocks) for _ in range(population_size - n_seeded)]
+        )
 
     def _generate_random_solution(self, products, stocks):
         """Generate a random solution."""
         solution = []
         for product in products:
             if product["quantity"] > 0:
-                stock_idx = random.randint(0, len(stocks) - 1)
-                stock = stocks[stock_idx]
-                stock_w, stock_h = self._get_stock_size_(stock)
-
-                pos_x = random.randint(0, max(0, stock_w - product["size"][0]))
-                pos_y = random.randint(0, max(0, stock_h - product["size"][1]))
-
-                solution.append({
-                    "stock_idx": stock_idx,
-                    "size": product["size"],
-                    "position": (pos_x, pos_y)
-                })
-        return solution
+                solution.append(self._random_gene(product, stocks))
+        return self._scorer.annotate(make_chromosome(solution))
+
+    def _random_gene(self, product, stocks):
+        """A gene at a uniformly random position of a random stock; a random block in block_mode."""
+        stock_idx = random.randint(0, len(stocks) - 1)
+        stock_w, stock_h = self._fits.stock_size[stock_idx]
+        rot = self._random_orientation(product["size"], stock_idx)
+        prod_w, prod_h = oriented(product["size"], rot)
+        n, cols = 1, 1
+        if self.block_mode:
+            n, cols = self._random_block(product["quantity"], stock_w, stock_h, prod_w, prod_h)
+        block_w, block_h = block_size((prod_w, prod_h), n, cols)
+
+        pos_x = random.randint(0, max(0, stock_w - block_w))
+        pos_y = random.randint(0, max(0, stock_h - block_h))
+
+        return (stock_idx, product["size"][0], product["size"][1], pos_x, pos_y, rot, n, cols)
+
+    def _random_block(self, quantity, stock_w, stock_h, prod_w, prod_h):
+        """(n, cols) of a random grid block of at most quantity pieces that fits the stock."""
+        max_cols = max(1, min(stock_w // max(prod_w, 1), quantity))
+        cols = random.randint(1, max_cols)
+        max_rows = max(1, min(stock_h // max(prod_h, 1), -(-quantity // cols)))
+        rows = random.randint(1, max_rows)
+        return min(quantity, cols * rows), cols
+
+    def _generate_seeded_solution(self, products, stocks):
+        """
+        Randomized bottom-left fill: pieces are placed in a random order, each at
+        the first free position of the first stock, in a random order, that has
+        room for it. Pieces are cut from scratch grids, so the genes never
+        overlap. A piece that fits nowhere gets a random gene. Genes keep the
+        order of products.
+        """
+        grids = {}
+        solution = [None] * len(products)
+        for i in random.sample(range(len(products)), len(products)):
+            product = products[i]
+            if product["quantity"] <= 0:
+                continue
+            for stock_idx in random.sample(range(len(stocks)), len(stocks)):
+                orients = self._orientations(product["size"], stock_idx)
+                random.shuffle(orients)
+                for rot in orients:
+                    if stock_idx not in grids:
+                        grids[stock_idx] = self._index[stock_idx].grid.copy()
+                    prod_w, prod_h = oriented(product["size"], rot)
+                    position = first_free_position(grids[stock_idx], (prod_w, prod_h))
+                    if position is not None:
+                        pos_x, pos_y = position
+                        grids[stock_idx][pos_x:pos_x + prod_w, pos_y:pos_y + prod_h] = -3  # Taken by this solution
+                        solution[i] = (stock_idx, product["size"][0], product["size"][1], pos_x, pos_y, rot, 1, 1)
+                        break
+                if solution[i] is not None:
+                    break
+            if solution[i] is None:
+                solution[i] = self._random_gene(product, stocks)
+        return self._scorer.annotate(make_chromosome([gene for gene in solution if gene is not None]))
 
     def _evaluate_fitness(self, solution, stocks):
         """Evaluate the fitness of a solution based on trim loss."""
-        total_trim_loss = 0
-        used_stocks = set()
-        used_area_by_stock = {}
-        for action in solution:
-            stock_idx = action["stock_idx"]
-            size = action["size"]
-            position = action["position"]
-
-            stock = stocks[stock_idx]
-            pos_x, pos_y = position
-            prod_w, prod_h = size
-
-            if self._can_place_(stock, position, size):
-                stock_area = np.sum(stock != -2)
-                used_area = prod_w * prod_h
-                trim_loss = max((stock_area - used_area) / stock_area, 0)  # Ensure non-negative
-                total_trim_loss += trim_loss
-                used_stocks.add(stock_idx)
-                used_area_by_stock[stock_idx] = used_area_by_stock.get(stock_idx, 0) + used_area
-
-        # Penalize excessive trim loss and reward better utilization
-        penalty = len(used_stocks) * 0.5
-        utilization_score = sum(
-            (used_area_by_stock[s] / np.sum(stocks[s] != -2)) for s in used_stocks
-        )
-        return total_trim_loss + penalty - utilization_score
+        return self._evaluate_population([solution], stocks)[0]
+
+    def _evaluate_population(self, population, stocks):
+        """Evaluate the fitness of every solution at once, scoring only the cache misses."""
+        keys = [chromosome_key(solution.genes) for solution in population]
+        fitness_scores = np.empty(len(population))
+        missing = []
+        for i, key in enumerate(keys):
+            fitness = self.fitness_cache.get(key)
+            if fitness is None:
+                missing.append(i)
+            else:
+                fitness_scores[i] = fitness
+
+        self.stats.count("cache_hits", len(population) - len(missing))
+        self.stats.count("fitness_evaluations", len(missing))
+        if missing:
+            scores = self._scorer.score(np.stack([population[i].totals for i in missing]))
+            for i, fitness in zip(missing, scores):
+                fitness_scores[i] = fitness
+                self.fitness_cache.put(keys[i], fitness)
+        return fitness_scores
 
     def _crossover(self, parent1, parent2):
         """Perform crossover between two parents."""
         crossover_point = random.randint(0, len(parent1) - 1)
 
-        def action_to_hashable(action):
-            """Convert action dictionary to a hashable representation."""
-            return (
-                action["stock_idx"],
-                tuple(action["size"]),  # Convert numpy array to tuple
-                tuple(action["position"])  # Convert numpy array to tuple
-            )
-
-        # Convert actions in parent1[:crossover_point] to hashable format
-        parent1_actions = set(action_to_hashable(a) for a in parent1[:crossover_point])
+        # Genes of parent2 already in parent1[:crossover_point] are skipped
+        return crossover(parent1, parent2, crossover_point)
 
-        # Build the child
-        child = parent1[:crossover_point] + [
-            action for action in parent2 if action_to_hashable(action) not in parent1_actions
-        ]
-        return child
 
+    def _set_gene(self, solution, idx, gene):
+        """Replace one gene; only its used area is computed, and the per-stock totals move in O(1)."""
+        stock_idx, prod_w, prod_h, pos_x, pos_y, rot, n, cols = (int(value) for value in gene)
+        prod_w, prod_h = oriented((prod_w, prod_h), rot)
+        solution.replace_gene(idx, gene, self._scorer.placed_area(stock_idx, pos_x, pos_y, prod_w, prod_h, n, cols))
 
     def _mutate(self, solution, products, stocks):
         """Đột biến giải pháp mà không sử dụng random."""
     # Tìm hành động gây lãng phí nhiều nhất
-        max_trim_loss_idx = None
-        max_trim_loss = -1
-
-        for idx, action in enumerate(solution):
-            stock_idx = action["stock_idx"]
-            size = action["size"]
-            position = action["position"]
-            stock = stocks[stock_idx]
-
-            if self._can_place_(stock, position, size):
-                stock_area = np.sum(stock != -2)
-                used_area = size[0] * size[1]
-                trim_loss = max((stock_area - used_area) / stock_area, 0)
-
-                if trim_loss > max_trim_loss:
-                    max_trim_loss = trim_loss
-                    max_trim_loss_idx = idx
+        max_trim_loss_idx = self._worst_gene(solution)
 
         # Nếu không tìm được hành động nào để cải thiện, kết thúc
         if max_trim_loss_idx is None:
@@ -160,31 +328,56 @@ class Policy2210xxx(Policy):
         # Tìm sản phẩm chưa được sử dụng và cố gắng đặt nó vào tốt hơn
         for product in products:
             if product["quantity"] > 0:
-                for stock_idx, stock in enumerate(stocks):
-                    stock_w, stock_h = self._get_stock_size_(stock)
-
-                    # Tìm vị trí phù hợp nhất
-                    best_position = None
-                    min_waste = float("inf")
-
-                    for pos_x in range(stock_w - product["size"][0] + 1):
-                        for pos_y in range(stock_h - product["size"][1] + 1):
-                            if self._can_place_(stock, (pos_x, pos_y), product["size"]):
-                                # Tính toán lãng phí
-                                waste = (stock_w * stock_h) - (product["size"][0] * product["size"][1])
-                                if waste < min_waste:
-                                    min_waste = waste
-                                    best_position = (pos_x, pos_y)
-
-                    # Nếu tìm được vị trí tốt hơn, thực hiện đột biến
-                    if best_position:
-                        solution[max_trim_loss_idx] = {
-                            "stock_idx": stock_idx,
-                            "size": product["size"],
-                            "position": best_position,
-                        }
-                        return
+                for stock_idx in range(len(stocks)):
+                    # Thử từng hướng đặt vừa kho này, hướng gốc trước
+                    for rot in self._orientations(product["size"], stock_idx):
+                        prod_w, prod_h = oriented(product["size"], rot)
+
+                        # Lãng phí không đổi trên một kho, nên vị trí tốt nhất là vị trí trống đầu tiên
+                        best_position = self._first_fit(stock_idx, prod_w, prod_h)
 
+                        # Nếu tìm được vị trí tốt hơn, thực hiện đột biến
+                        if best_position:
+                            gene = (stock_idx, product["size"][0], product["size"][1], *best_position, rot, 1, 1)
+                            self._set_gene(solution, max_trim_loss_idx, gene)
+                            return
+
+
+    def _worst_gene(self, solution):
+        """
+        Index of the feasible gene with the highest trim loss, the first one on
+        ties, or None when no gene is feasible on the current stocks.
+        """
+        feasible = solution["used"] > 0  # Kept up to date by the operators
+        if not feasible.any():
+            return None
+        stock_area = self._fits.stock_area[solution["stock_idx"]]
+        trim_loss = np.maximum((stock_area - solution["used"]) / stock_area, 0)
+        return int(np.argmax(np.where(feasible, trim_loss, -1)))
+
+    def _first_fit(self, stock_idx, prod_w, prod_h):
+        """First free (x, y) of a prod_w x prod_h piece on a stock, from one feasibility map per size."""
+        key = (stock_idx, prod_w, prod_h)
+        if key not in self._first_fits:
+            stock = self._index[stock_idx]
+            grid_w, grid_h = stock.grid.shape
+            self.stats.count("positions_scanned", max(grid_w - prod_w + 1, 0) * max(grid_h - prod_h + 1, 0))
+            self._first_fits[key] = first_free_position(stock.grid, (prod_w, prod_h), stock.occupied)
+        return self._first_fits[key]
+
+    def _orientations(self, prod_size, stock_idx):
+        """Orientation genes that fit a product on a stock, as given first; only 0 without rotation."""
+        orients = self._fits.fitting_orientations(prod_size, stock_idx)
+        if not self.rotation:
+            orients = [orient for orient in orients if orient == 0]
+        return orients
+
+    def _random_orientation(self, prod_size, stock_idx):
+        """A fitting orientation gene, drawn at random only when both fit."""
+        orients = self._orientations(prod_size, stock_idx)
+        if len(orients) > 1:
+            return random.choice(orients)
+        return orients[0] if orients else 0
 
     def _is_action_valid(self, action, products, stocks):
         """Check if an action is valid."""
@@ -192,9 +385,7 @@ class Policy2210xxx(Policy):
         size = action["size"]
         position = action["position"]
 
-        stock = stocks[stock_idx]
-        product_exists = any(
-            np.array_equal(size, product["size"]) and product["quantity"] > 0
-            for product in products
-        )
-        return product_exists and self._can_place_(stock, position, size)
+        self.stats.count("placement_checks")
+        product_exists = self._fits.in_demand(size)
+        # Packed free rows of the synced index instead of slicing the stock
+        return product_exists and self._index[stock_idx].can_place(position, size)
@@ -0,0 +1,162 @@
+import copy
+import threading
+from collections import deque
+
+import numpy as np
+
+from plan import CuttingPlan
+from stats import PolicyStats
+from stock_index import OccupancyIndex
+
+
+def copy_observation(observation):
+    """Observation with its own stock grids and product quantities."""
+    return {
+        "stocks": tuple(np.array(stock, copy=True) for stock in observation["stocks"]),
+        "products": [dict(product) for product in observation["products"]],
+    }
+
+
+def apply_action(observation, action):
+    """
+    Apply an action to an observation in place, as the environment's step does.
+    Returns False, leaving the observation unchanged, when it would be rejected.
+    """
+    stock_idx = action["stock_idx"]
+    prod_w, prod_h = int(action["size"][0]), int(action["size"][1])
+    pos_x, pos_y = int(action["position"][0]), int(action["position"][1])
+
+    product_idx = None
+    for i, product in enumerate(observation["products"]):
+        if product["quantity"] == 0:
+            continue
+        if np.array_equal(product["size"], (prod_w, prod_h)) or np.array_equal(product["size"], (prod_h, prod_w)):
+            product_idx = i
+            break
+    if product_idx is None or not 0 <= stock_idx < len(observation["stocks"]):
+        return False
+
+    stock = observation["stocks"][stock_idx]
+    stock_w = np.sum(np.any(stock != -2, axis=1))
+    stock_h = np.sum(np.any(stock != -2, axis=0))
+    if pos_x < 0 or pos_y < 0 or pos_x + prod_w > stock_w or pos_y + prod_h > stock_h:
+        return False
+    if not np.all(stock[pos_x:pos_x + prod_w, pos_y:pos_y + prod_h] == -1):
+        return False
+    stock[pos_x:pos_x + prod_w, pos_y:pos_y + prod_h] = product_idx
+    observation["products"][product_idx]["quantity"] -= 1
+    return True
+
+
+class BackgroundPlanner:
+    """
+    Solves ahead of the environment on a worker thread.
+
+    Whenever the policy has to compute an action itself, the planner predicts the
+    observation that action leads to and hands it to the worker, which plays a
+    private copy of the policy forward from there, one action at a time, while
+    the caller steps the environment. The next get_action serves those actions
+    through a CuttingPlan, so an action is only returned while it is still valid
+    on the real stocks; otherwise the policy solves synchronously and the worker
+    restarts from the new state. horizon caps the actions planned per job. A job
+    whose policy raises just ends early, and a worker thread that died is started
+    again on the next job.
+    """
+
+    def __init__(self, policy, solve, horizon=None):
+        self.solve = solve  # Synchronous fallback: solve(observation, info) -> action
+        self.horizon = horizon
+        self.worker_policy = copy.deepcopy(policy)
+        self.worker_policy.stats = PolicyStats()  # Stats only count the caller's work
+
+        self._index = OccupancyIndex()
+        self._plan = CuttingPlan()
+        self._cond = threading.Condition()
+        self._token = 0  # Id of the latest job; older jobs stop at their next action
+        self._job = None  # (token, observation) not yet picked up by the worker
+        self._ready = deque()  # Actions of the latest job not yet handed out
+        self._running = False  # The latest job may still produce actions
+        self._stream = None  # Token of the job to serve from on the next call
+        self._closed = False
+        self._thread = None
+
+    def get_action(self, observation, info):
+        index = self._index.sync(observation["stocks"], observation["products"])
+        if self._stream is not None:
+            self._plan.load(self._actions(self._stream), index)
+            self._stream = None
+        action = self._plan.next_action(observation["products"], index)
+        if action is not None:
+            return action
+
+        action = self.solve(observation, info)
+        self._submit(observation, action)
+        return action
+
+    def close(self):
+        """Stop the worker thread and close the worker's copy of the policy."""
+        with self._cond:
+            self._closed = True
+            self._token += 1
+            self._cond.notify_all()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        self.worker_policy.close()
+
+    def _submit(self, observation, action):
+        predicted = copy_observation(observation)
+        if not apply_action(predicted, action) or not any(p["quantity"] > 0 for p in predicted["products"]):
+            return
+        with self._cond:
+            self._token += 1
+            self._job = (self._token, predicted)
+            self._ready.clear()
+            self._running = True
+            self._cond.notify_all()
+        self._stream = self._token
+        if self._thread is None or not self._thread.is_alive():
+            self._thread = threading.Thread(target=self._work, daemon=True)
+            self._thread.start()
+
+    def _actions(self, token):
+        """Actions of a job in order, waiting for the worker when it is behind."""
+        while True:
+            with self._cond:
+                while not self._ready and self._running and self._token == token:
+                    self._cond.wait()
+                if self._token != token or not self._ready:
+                    return
+                action = self._ready.popleft()
+            yield action
+
+    def _work(self):
+        while True:
+            with self._cond:
+                while self._job is None and not self._closed:
+                    self._cond.wait()
+                if self._closed:
+                    return
+                token, observation = self._job
+                self._job = None
+            try:
+                planned = 0
+                while self.horizon is None or planned < self.horizon:
+                    if not any(product["quantity"] > 0 for product in observation["products"]):
+                        break
+                    action = self.worker_policy.get_action(observation, {})
+                    if not apply_action(observation, action):
+                        break
+                    with self._cond:
+                        if self._token != token:
+                            break
+                        self._ready.append(action)
+                        self._cond.notify_all()
+                    planned += 1
+            except Exception:
+                pass  # The job ends here; the caller solves synchronously from its next state
+            finally:
+                with self._cond:
+                    if self._token == token:
+                        self._running = False
+                        self._cond.notify_all()
@@ -0,0 +1,173 @@
+import argparse
+import itertools
+import json
+import os
+import random
+import sys
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+
+import numpy as np
+
+from benchmark import POLICIES, make_policy, run_episode
+from instance_io import load_instance, save_solution
+from local_env import CuttingStockEnv
+
+
+def iter_instances(sources):
+    """
+    Yield (instance_id, instance) from instance files, lazily.
+
+    A source is a directory (its *.json, *.jsonl and *.csi files, sorted), a .json
+    file holding one instance, a .jsonl file with one instance per line, a .csi
+    binary instance, or "-" for JSON lines on stdin. Lines of a .jsonl source are
+    identified as path:line. Binary instances are yielded as their path and
+    memory-mapped by the worker, so they are never pickled.
+    """
+    for source in sources:
+        if source == "-":
+            yield from _iter_lines(sys.stdin, "-")
+        elif os.path.isdir(source):
+            names = sorted(name for name in os.listdir(source) if name.endswith((".json", ".jsonl", ".csi")))
+            yield from iter_instances([os.path.join(source, name) for name in names])
+        elif source.endswith(".csi"):
+            yield source, source
+        elif source.endswith(".jsonl"):
+            with open(source) as lines:
+                yield from _iter_lines(lines, source)
+        else:
+            with open(source) as file:
+                yield source, json.load(file)
+
+
+def _iter_lines(lines, name):
+    for number, line in enumerate(lines, 1):
+        if line.strip():
+            yield f"{name}:{number}", json.loads(line)
+
+
+def completed_ids(path, policy_name):
+    """
+    Ids of the instances a results file already holds a result of policy_name
+    for, so a rerun can resume. Rows of other policies and failed instances
+    do not count, so those are solved again.
+    """
+    done = set()
+    if path is None or not os.path.exists(path):
+        return done
+    with open(path) as results:
+        for line in results:
+            try:
+                row = json.loads(line)
+                if row["policy"] == policy_name and "error" not in row:
+                    done.add(row["instance"])
+            except (ValueError, KeyError, TypeError):
+                continue  # A line cut short when the previous run stopped
+    return done
+
+
+# Per-process policy, built once by the pool initializer and reused across episodes
+_worker = {}
+
+
+def _init_worker(policy_name, policy_args):
+    _worker["policy"] = make_policy(policy_name, **policy_args)
+
+
+def solve_instance(instance_id, instance, max_invalid=3, solution_path=None):
+    """
+    Worker entry point: play one episode with the warm policy and return its
+    result row. instance is a dict or the path of a binary instance. With
+    solution_path, the accepted actions are saved there for later verification.
+    """
+    row = {"instance": instance_id}
+    try:
+        if isinstance(instance, str):
+            instance = load_instance(instance)
+        seed = instance.get("seed", 0)
+        random.seed(seed)
+        np.random.seed(seed)
+        actions = []
+        row.update(run_episode(_worker["policy"], CuttingStockEnv(instance), max_invalid=max_invalid, actions=actions))
+        if solution_path is not None:
+            save_solution(solution_path, actions, {"instance": instance_id})
+            row["solution"] = solution_path
+    except Exception as error:
+        row["error"] = repr(error)
+    return row
+
+
+def solution_file(solutions_dir, instance_id):
+    """File name of the solution of an instance inside solutions_dir."""
+    name = "".join(char if char.isalnum() or char in "-_." else "_" for char in instance_id.strip(os.sep))
+    return os.path.join(solutions_dir, name + ".csol")
+
+
+def run_batch(instances, policy_name, out, policy_args=None, workers=None, max_pending=None,
+              max_invalid=3, skip=(), solutions_dir=None):
+    """
+    Solve every (instance_id, instance) not in skip on a pool of workers, one
+    episode per task, and write a JSON line per result to out as soon as it is
+    ready. At most max_pending instances are read ahead of the workers, which
+    bounds memory on long streams. With solutions_dir, every solution is also
+    saved there in the binary format. Returns the number of instances solved.
+    """
+    workers = workers or os.cpu_count() or 1
+    max_pending = max_pending or 2 * workers
+    todo = ((instance_id, instance) for instance_id, instance in instances if instance_id not in skip)
+    solved = 0
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                             initargs=(policy_name, policy_args or {})) as pool:
+        pending = set()
+        while True:
+            for instance_id, instance in itertools.islice(todo, max_pending - len(pending)):
+                path = None if solutions_dir is None else solution_file(solutions_dir, instance_id)
+                pending.add(pool.submit(solve_instance, instance_id, instance, max_invalid, path))
+            if not pending:
+                break
+            finished, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in finished:
+                out.write(json.dumps({"policy": policy_name, **future.result()}, default=str) + "\n")
+                out.flush()
+                solved += 1
+    return solved
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Solve many cutting-stock instances in parallel.")
+    parser.add_argument("sources", nargs="+", help="instance directories, .json/.jsonl files, or - for stdin")
+    parser.add_argument("--policy", choices=sorted(POLICIES), default="greedy")
+    parser.add_argument("--policy-args", type=json.loads, default={},
+                        help='JSON constructor kwargs of the policy, e.g. \'{"time_budget_ms": 50}\'')
+    parser.add_argument("--workers", type=int, help="worker processes (default: one per core)")
+    parser.add_argument("--max-pending", type=int, help="instances read ahead of the workers (default: 2 per worker)")
+    parser.add_argument("--max-invalid", type=int, default=3)
+    parser.add_argument("--output",
+                        help="JSON lines file to append to; instances the policy already solved in it are skipped")
+    parser.add_argument("--solutions", help="directory where the solution of every instance is saved")
+    args = parser.parse_args(argv)
+
+    skip = completed_ids(args.output, args.policy)
+    if args.solutions:
+        os.makedirs(args.solutions, exist_ok=True)
+    out = sys.stdout
+    if args.output:
+        out = open(args.output, "a+")
+        # Start on a fresh line if the previous run stopped in the middle of one
+        if out.tell() > 0:
+            out.seek(out.tell() - 1)
+            if out.read(1) != "\n":
+                out.write("\n")
+    try:
+        solved = run_batch(
+            iter_instances(args.sources), args.policy, out, args.policy_args,
+            workers=args.workers, max_pending=args.max_pending, max_invalid=args.max_invalid, skip=skip,
+            solutions_dir=args.solutions,
+        )
+    finally:
+        if args.output:
+            out.close()
+    print(f"Solved {solved} instances; {len(skip)} were already solved by {args.policy} in the output", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,171 @@
+import argparse
+import contextlib
+import csv
+import importlib
+import io
+import json
+import random
+import sys
+import time
+import tracemalloc
+
+import numpy as np
+
+from local_env import CuttingStockEnv, generate_instance
+
+# Policy name -> module defining Policy2210xxx
+POLICIES = {
+    "greedy": "greedy",
+    "bruteforce": "bruteforce",
+    "ga": "GA",
+    "ga_mutate_50_random": "GA_mutate_50_random",
+    "ga_mutate_no_random": "GA_mutate_no_random",
+}
+
+
+def make_policy(name, **kwargs):
+    """Instantiate the Policy2210xxx of a registered policy."""
+    return importlib.import_module(POLICIES[name]).Policy2210xxx(**kwargs)
+
+
+def run_episode(policy, env, max_invalid=3, trace_memory=False, quiet=True, actions=None):
+    """
+    Play one episode until the demand is met or the policy returns max_invalid
+    actions in a row that the environment rejects. Returns the episode metrics;
+    peak_memory_kb is only measured with trace_memory, which slows the policies down.
+    A policy built with stats=True also reports its episode stats under "stats".
+    Accepted actions are appended to the actions list, when one is given.
+    """
+    observation, info = env.reset()
+    total_pieces = sum(product["quantity"] for product in observation["products"])
+    latencies = []
+    invalid_in_row = 0
+    terminated = False
+
+    if trace_memory:
+        tracemalloc.start()
+    start = time.perf_counter()
+    while not terminated and invalid_in_row < max_invalid:
+        remaining = sum(product["quantity"] for product in observation["products"])
+        tick = time.perf_counter()
+        with contextlib.redirect_stdout(io.StringIO()) if quiet else contextlib.nullcontext():
+            action = policy.get_action(observation, info)
+        latencies.append(time.perf_counter() - tick)
+
+        observation, reward, terminated, truncated, info = env.step(action)
+        placed = remaining - sum(product["quantity"] for product in observation["products"])
+        invalid_in_row = 0 if placed else invalid_in_row + 1
+        if placed and actions is not None:
+            actions.append(action)
+    episode_time = time.perf_counter() - start
+    peak_memory = None
+    if trace_memory:
+        peak_memory = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+
+    latencies_ms = np.array(latencies) * 1000
+    remaining = sum(product["quantity"] for product in observation["products"])
+    metrics = {
+        "decisions": len(latencies),
+        "latency_p50_ms": float(np.percentile(latencies_ms, 50)),
+        "latency_p90_ms": float(np.percentile(latencies_ms, 90)),
+        "latency_p99_ms": float(np.percentile(latencies_ms, 99)),
+        "latency_max_ms": float(latencies_ms.max()),
+        "episode_time_s": episode_time,
+        "peak_memory_kb": None if peak_memory is None else peak_memory / 1024,
+        "pieces_placed": total_pieces - remaining,
+        "pieces_total": total_pieces,
+        "completed": bool(terminated),
+        "stocks_used": int(np.sum(env.cutted_stocks)),
+        "filled_ratio": info["filled_ratio"],
+        "trim_loss": info["trim_loss"],
+    }
+    if getattr(policy, "stats", None) is not None and policy.stats.enabled:
+        metrics["stats"] = policy.stats.end_episode()
+    return metrics
+
+
+def run_benchmark(policies, seeds, instance_args, policy_args=None, track_memory=True, **episode_args):
+    """
+    Run every policy on the instance generated for every seed; one result row per pair.
+    Python and NumPy RNGs are reseeded per episode, and peak memory comes from a
+    second, traced replay so that tracing does not skew the latencies.
+    """
+    policy_args = policy_args or {}
+    results = []
+    for seed in seeds:
+        instance = generate_instance(seed, **instance_args)
+        for name in policies:
+            row = {"policy": name, "seed": seed, **instance_args}
+            row.update(_seeded_episode(name, policy_args.get(name, {}), instance, seed, **episode_args))
+            if track_memory:
+                traced = _seeded_episode(name, policy_args.get(name, {}), instance, seed,
+                                         trace_memory=True, **episode_args)
+                row["peak_memory_kb"] = traced["peak_memory_kb"]
+            results.append(row)
+    return results
+
+
+def _seeded_episode(name, kwargs, instance, seed, **episode_args):
+    random.seed(seed)
+    np.random.seed(seed)
+    policy = make_policy(name, **kwargs)
+    try:
+        return run_episode(policy, CuttingStockEnv(instance), **episode_args)
+    finally:
+        if hasattr(policy, "close"):
+            policy.close()
+
+
+def write_results(results, out, fmt="json"):
+    if fmt == "json":
+        json.dump(results, out, indent=2, default=str)
+        out.write("\n")
+        return
+    writer = csv.DictWriter(out, fieldnames=list(results[0]) if results else [])
+    writer.writeheader()
+    for row in results:
+        writer.writerow({key: json.dumps(value) if isinstance(value, (list, tuple)) else value
+                         for key, value in row.items()})
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the cutting-stock policies on seeded instances.")
+    parser.add_argument("--policies", nargs="+", choices=sorted(POLICIES), default=sorted(POLICIES))
+    parser.add_argument("--seeds", nargs="+", type=int, default=[0])
+    parser.add_argument("--n-stocks", type=int, default=10)
+    parser.add_argument("--stock-size", nargs=2, type=int, default=[50, 100], metavar=("MIN", "MAX"))
+    parser.add_argument("--n-products", type=int, default=10)
+    parser.add_argument("--product-size", nargs=2, type=int, default=[5, 30], metavar=("MIN", "MAX"))
+    parser.add_argument("--quantity", nargs=2, type=int, default=[1, 10], metavar=("MIN", "MAX"))
+    parser.add_argument("--grid", nargs=2, type=int, default=[100, 100], metavar=("MAX_W", "MAX_H"))
+    parser.add_argument("--policy-args", type=json.loads, default={},
+                        help='JSON constructor kwargs per policy, e.g. \'{"ga": {"time_budget_ms": 50}}\'')
+    parser.add_argument("--max-invalid", type=int, default=3)
+    parser.add_argument("--no-memory", action="store_true", help="skip the traced replay that measures peak memory")
+    parser.add_argument("--format", choices=["json", "csv"], default="json")
+    parser.add_argument("--output", help="write results here instead of stdout")
+    args = parser.parse_args(argv)
+
+    instance_args = {
+        "n_stocks": args.n_stocks,
+        "stock_size": tuple(args.stock_size),
+        "n_products": args.n_products,
+        "product_size": tuple(args.product_size),
+        "quantity": tuple(args.quantity),
+        "max_w": args.grid[0],
+        "max_h": args.grid[1],
+    }
+    results = run_benchmark(
+        args.policies, args.seeds, instance_args, args.policy_args,
+        max_invalid=args.max_invalid, track_memory=not args.no_memory,
+    )
+    if args.output:
+        with open(args.output, "w", newline="") as out:
+            write_results(results, out, args.format)
+    else:
+        write_results(results, sys.stdout, args.format)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,36 @@
+import numpy as np
+
+
+def pack_lines(free):
+    """One Python int per y line of a (W, H) free mask, with bit x set when (x, y) is free."""
+    packed = np.packbits(free, axis=0, bitorder="little").T
+    return [int.from_bytes(line.tobytes(), "little") for line in packed]
+
+
+class StockBitset:
+    """
+    Free cells of a stock packed into one Python int per y line.
+
+    A w x h feasibility check is h masked ANDs whatever the size of the piece,
+    instead of slicing and comparing w * h cells of the int grid.
+    """
+
+    def __init__(self, free):
+        self.width, self.height = free.shape
+        self.rows = pack_lines(free)
+
+    def update(self, free, y0, y1):
+        """Repack lines y0 to y1 of the current free mask after a cut."""
+        self.rows[y0:y1] = pack_lines(free[:, y0:y1])
+
+    def fits(self, pos_x, pos_y, prod_w, prod_h):
+        """True when the prod_w x prod_h rectangle at (pos_x, pos_y) is inside the stock and free."""
+        if pos_x < 0 or pos_y < 0 or prod_w <= 0 or prod_h <= 0:
+            return False
+        if pos_x + prod_w > self.width or pos_y + prod_h > self.height:
+            return False
+        mask = ((1 << int(prod_w)) - 1) << int(pos_x)
+        for row in self.rows[pos_y:pos_y + prod_h]:
+            if row & mask != mask:
+                return False
+        return True
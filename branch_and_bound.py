@@ -0,0 +1,237 @@
+import hashlib
+import time
+
+import numpy as np
+
+from plan import size_key
+
+
+class SearchLimit(Exception):
+    """Raised inside the search when the node, time or depth limit is reached."""
+
+
+class _Proven(Exception):
+    """Raised inside the search when the best layout meets the root lower bound."""
+
+
+class BranchAndBound:
+    """
+    Exact layout search: depth-first branch-and-bound over whole placement
+    sequences that cut the remaining demand while using the least stock area.
+
+    Stocks are filled one at a time. On the open stock, the first free cell in
+    x-then-y order is either the corner of one remaining product, in either
+    orientation, or left as waste; every layout is reached this way exactly
+    once, so the order of the pieces is canonical. Identical products are
+    counted rather than told apart, and only the first unused stock of every
+    size may be opened. Stocks the observation already cut cost nothing more
+    and are filled first.
+
+    A branch is cut when the used stock area plus the area still needed for the
+    remaining pieces cannot beat the best layout found. States reached again,
+    keyed by a hash of the open stock's occupancy, the used stocks and the
+    remaining counts, are skipped through a transposition table.
+
+    The dive recurses once per piece and per opened stock, so demands that
+    would go deeper than depth_limit frames are not searched at all, and the
+    search stops like at the node limit if it ever gets that deep.
+
+    After solve(), optimal tells whether the best layout was proven optimal
+    within node_limit nodes and time_limit seconds; otherwise it is only the
+    best one found. lower_bound is the area bound of the root, against which
+    any layout of the demand can be measured.
+    """
+
+    def __init__(self, index, products, node_limit=None, time_limit=None, table_size=1 << 20, depth_limit=400):
+        self.node_limit = node_limit
+        self.time_limit = time_limit
+        self.depth_limit = depth_limit
+        self.table_size = table_size
+
+        # Remaining demand by orientation-free size, largest pieces first
+        counts = {}
+        for product in products:
+            if product["quantity"] > 0:
+                key = size_key(product["size"])
+                counts[key] = counts.get(key, 0) + product["quantity"]
+        self.sizes = sorted(counts, key=lambda size: (-size[0] * size[1], size))
+        self.remaining = [counts[size] for size in self.sizes]
+        self.remaining_area = sum(count * w * h for count, (w, h) in zip(self.remaining, self.sizes))
+
+        self.free = [stock.grid == -1 for stock in index]
+        self.free_count = [stock.free_area for stock in index]
+        self.stock_area = [stock.area for stock in index]
+        self.stock_size = [(stock.width, stock.height) for stock in index]
+        self.used = [stock.free_area != stock.area for stock in index]
+        self.used_area = sum(area for area, used in zip(self.stock_area, self.used) if used)
+        self.pending = [stock_idx for stock_idx, used in enumerate(self.used) if used]
+
+        self.placements = []
+        self.best = None
+        self.best_area = float("inf")
+        self.nodes = 0
+        self.transpositions = 0
+        self.optimal = False
+        self.lower_bound = None
+        self._table = set()
+        self._sums = {}  # Used stocks mask -> subset sums of the unused stock areas
+        self._deadline = None
+        self._depth = 0
+
+    def solve(self):
+        """Returns the actions of the best layout found, or None when none cuts the whole demand."""
+        if self.time_limit is not None:
+            self._deadline = time.perf_counter() + self.time_limit
+        self.lower_bound = self._lower_bound(sum(self.free_count[stock_idx] for stock_idx in self.pending))
+        if sum(self.remaining) + 2 * len(self.free) > self.depth_limit:
+            return None  # Too many pieces for an exact search
+        try:
+            if self.lower_bound is not None:
+                self._next_stock(0)
+            self.optimal = True
+        except _Proven:
+            self.optimal = True
+        except SearchLimit:
+            pass
+        if self.best is None:
+            return None
+        return [
+            {"stock_idx": stock_idx, "size": [prod_w, prod_h], "position": (pos_x, pos_y)}
+            for stock_idx, prod_w, prod_h, pos_x, pos_y in self.best
+        ]
+
+    def _lower_bound(self, pending_free):
+        """Least stock area any completion can end with, or None if the unused stocks are too small."""
+        need = self.remaining_area - pending_free
+        if need <= 0:
+            return self.used_area
+        # Smallest total area of unused stocks that can hold what does not fit the used ones
+        reachable = self._subset_sums()
+        reachable >>= need
+        if not reachable:
+            return None
+        return self.used_area + need + (reachable & -reachable).bit_length() - 1
+
+    def _subset_sums(self):
+        """Bit mask of every total area a set of unused stocks can have, per set of used stocks."""
+        used = self._used_mask()
+        if used not in self._sums:
+            reachable = 1
+            for area, stock_used in zip(self.stock_area, self.used):
+                if not stock_used:
+                    reachable |= reachable << area
+            self._sums[used] = reachable
+        return self._sums[used]
+
+    def _used_mask(self):
+        return sum(1 << stock_idx for stock_idx, used in enumerate(self.used) if used)
+
+    def _next_stock(self, pending_pos):
+        """Fill the next already cut stock, or branch on the stock to open."""
+        if pending_pos < len(self.pending):
+            self._fill(self.pending[pending_pos], 0, pending_pos + 1)
+            return
+
+        opened = set()
+        order = sorted(range(len(self.free)), key=lambda stock_idx: -self.stock_area[stock_idx])
+        for stock_idx in order:
+            if self.used[stock_idx] or self.stock_size[stock_idx] in opened:
+                continue
+            opened.add(self.stock_size[stock_idx])
+            self.used[stock_idx] = True
+            self.used_area += self.stock_area[stock_idx]
+            try:
+                self._fill(stock_idx, 0, pending_pos)
+            finally:
+                self.used[stock_idx] = False
+                self.used_area -= self.stock_area[stock_idx]
+
+    def _fill(self, stock_idx, start, pending_pos):
+        self._depth += 1
+        if self._depth > self.depth_limit:
+            self._depth -= 1
+            raise SearchLimit
+        free = self.free[stock_idx]
+        flat = free.reshape(-1)
+        grid_h = free.shape[1]
+        wasted = []
+        try:
+            while True:
+                self._count_node()
+                if self.remaining_area == 0:
+                    if self.used_area < self.best_area:
+                        self.best_area = self.used_area
+                        self.best = list(self.placements)
+                        if self.best_area <= self.lower_bound:
+                            raise _Proven
+                    return
+
+                pending_free = self.free_count[stock_idx] + sum(
+                    self.free_count[other] for other in self.pending[pending_pos:]
+                )
+                bound = self._lower_bound(pending_free)
+                if bound is None or bound >= self.best_area:
+                    return
+
+                cell = start + int(np.argmax(flat[start:])) if start < flat.size else flat.size
+                if cell >= flat.size or not flat[cell]:
+                    break  # The stock is full
+                if not self._visit(stock_idx, cell, free):
+                    return
+
+                pos_x, pos_y = divmod(cell, grid_h)
+                for size_idx, (prod_w, prod_h) in enumerate(self.sizes):
+                    if self.remaining[size_idx] == 0:
+                        continue
+                    orientations = [(prod_w, prod_h)] if prod_w == prod_h else [(prod_w, prod_h), (prod_h, prod_w)]
+                    for orient_w, orient_h in orientations:
+                        region = free[pos_x:pos_x + orient_w, pos_y:pos_y + orient_h]
+                        if region.shape != (orient_w, orient_h) or not region.all():
+                            continue
+                        self._place(stock_idx, size_idx, pos_x, pos_y, orient_w, orient_h, False)
+                        try:
+                            self._fill(stock_idx, cell + 1, pending_pos)
+                        finally:
+                            self._place(stock_idx, size_idx, pos_x, pos_y, orient_w, orient_h, True)
+
+                # Leave the cell as waste and move on to the next free one
+                flat[cell] = False
+                self.free_count[stock_idx] -= 1
+                wasted.append(cell)
+                start = cell + 1
+
+            self._next_stock(pending_pos)
+        finally:
+            flat[wasted] = True
+            self.free_count[stock_idx] += len(wasted)
+            self._depth -= 1
+
+    def _place(self, stock_idx, size_idx, pos_x, pos_y, prod_w, prod_h, undo):
+        self.free[stock_idx][pos_x:pos_x + prod_w, pos_y:pos_y + prod_h] = undo
+        sign = 1 if undo else -1
+        self.free_count[stock_idx] += sign * prod_w * prod_h
+        self.remaining[size_idx] += sign
+        self.remaining_area += sign * prod_w * prod_h
+        if undo:
+            self.placements.pop()
+        else:
+            self.placements.append((stock_idx, prod_w, prod_h, pos_x, pos_y))
+
+    def _visit(self, stock_idx, cell, free):
+        """Record a search state; False when it was already searched."""
+        used = self._used_mask()
+        occupancy = hashlib.blake2b(np.packbits(free).tobytes(), digest_size=8).digest()
+        key = (stock_idx, cell, used, tuple(self.remaining), occupancy)
+        if key in self._table:
+            self.transpositions += 1
+            return False
+        if len(self._table) < self.table_size:
+            self._table.add(key)
+        return True
+
+    def _count_node(self):
+        self.nodes += 1
+        if self.node_limit is not None and self.nodes > self.node_limit:
+            raise SearchLimit
+        if self._deadline is not None and self.nodes % 1024 == 0 and time.perf_counter() >= self._deadline:
+            raise SearchLimit
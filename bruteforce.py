@@ -1,13 +1,54 @@
 from policy import Policy
+from branch_and_bound import BranchAndBound
+from fit_table import FitTable
+from pattern_library import PatternLibrary, PatternReplay
+from placement import edge_trim_loss, feasible_positions, first_min_candidate, first_min_position, grid_positions
+from plan import CuttingPlan
+from stats import PolicyStats
+from stock_index import OccupancyIndex
+import time
 
 
 class Policy2210xxx(Policy):
-    def __init__(self, policy_id=1):
+    def __init__(self, policy_id=1, backend="grid", prune=True, stats=False, stats_log=None,
+                 pattern_library=None, pattern_library_size=1024, exact=False, node_limit=1000000,
+                 time_limit_ms=10000):
         """
         Initializes the custom policy with a specific ID.
+        backend picks how candidate positions are found: "grid" scans every cell
+        of the stock, "maxrects" only scores corners of the maximal free rectangles.
+        prune visits (product, stock, orientation) candidates by a lower bound on
+        their trim loss and stops once no remaining one can win; the chosen
+        action is the same as with the exhaustive search.
+        stats turns on the counters and phase timers of self.stats; with stats_log,
+        the stats of every episode are appended to that file as a JSON line.
+        With pattern_library, the path of a JSON file, whole-stock cutting patterns
+        are remembered across episodes and replayed before searching when an uncut
+        stock and the remaining demand match one; the file keeps at most
+        pattern_library_size patterns, dropping the least recently used.
+        With exact, the first call of an episode runs a branch-and-bound search for
+        the layout of the whole demand that uses the least stock area, within
+        node_limit nodes and time_limit_ms, and later calls replay it; the search
+        is kept in self.last_search so heuristics can be measured against it.
         """
         assert policy_id in [1, 2], "Policy ID must be 1 or 2"
+        assert backend in ["grid", "maxrects"], "Backend must be grid or maxrects"
         self.policy_id = policy_id  # Store the policy ID for later use
+        self.backend = backend
+        self.prune = prune
+        # Per-stock occupancy kept across calls
+        self._index = OccupancyIndex(track_free_rects=backend == "maxrects")
+        self._fits = FitTable()  # Product x stock x orientation fit flags of the episode
+        self.stats = PolicyStats(stats, stats_log)
+        self.exact = exact
+        self.node_limit = node_limit
+        self.time_limit_ms = time_limit_ms
+        self._plan = CuttingPlan()  # Layout of the last exact search
+        self._failed_episode = None  # Episode where the exact search found no layout
+        self.last_search = None
+        self._patterns = None
+        if pattern_library is not None:
+            self._patterns = PatternReplay(PatternLibrary(pattern_library, pattern_library_size), self._index)
 
         # Student code here
         if policy_id == 1:
@@ -19,49 +60,139 @@ class Policy2210xxx(Policy):
         """
         Implements a brute force policy to minimize trim loss.
         """
+        return self._lookup_or_solve(observation, info)
+
+    def _lookup_or_solve(self, observation, info):
+        """Replay a stored pattern if one matches, else solve."""
+        if self._patterns is None:
+            return self._solve(observation, info)
+        return self._patterns.get_action(observation, info, self._solve)
+
+    def close(self):
+        """Save the pattern library and log the last episode's stats."""
+        if self._patterns is not None:
+            self._patterns.flush()
+        self.stats.end_episode()
+
+    def _solve(self, observation, info):
+        """One synchronous brute force search on the observation."""
         print(f"Running brute force Policy2210xxx with ID: {self.policy_id}")
 
         # Initialize the best placement
         best_placement = None
-        min_trim_loss = float("inf")  # Minimum trim loss found
-
-        for prod in observation["products"]:
-            if prod["quantity"] > 0:  # Only consider products with positive quantity
-                prod_size = prod["size"]
-
-                # Evaluate all possible placements across all stocks
-                for stock_idx, stock in enumerate(observation["stocks"]):
-                    stock_w, stock_h = self._get_stock_size_(stock)
-
-                    # Try both orientations of the product
-                    for orientation in [(prod_size[0], prod_size[1]), (prod_size[1], prod_size[0])]:
-                        prod_w, prod_h = orientation
-                        if stock_w >= prod_w and stock_h >= prod_h:
-                            # Check every valid position on the stock
-                            for x in range(stock_w - prod_w + 1):
-                                for y in range(stock_h - prod_h + 1):
-                                    if self._can_place_(stock, (x, y), (prod_w, prod_h)):
-                                        # Calculate trim loss if placed here
-                                        remaining_w = stock_w - (x + prod_w)
-                                        remaining_h = stock_h - (y + prod_h)
-                                        trim_loss = remaining_w * stock_h + remaining_h * stock_w - remaining_w * remaining_h
-
-                                        # Update the best placement if this is optimal
-                                        if trim_loss < min_trim_loss:
-                                            min_trim_loss = trim_loss
-                                            best_placement = {
-                                                "stock_idx": stock_idx,
-                                                "size": [prod_w, prod_h],
-                                                "position": (x, y),
-                                            }
+        best_key = None  # (trim loss, product, stock, orientation) of the best placement
+
+        # Bring the per-stock occupancy index up to date with the last cut
+        tick = time.perf_counter()
+        index = self._index.sync(observation["stocks"], observation["products"])
+        fits = self._fits.sync(observation["products"], index)
+        self.stats.start_call(index.episode)
+        self.stats.add_time("init", time.perf_counter() - tick)
+
+        if self.exact:
+            action = self._exact_action(observation["products"], index)
+            if action is not None:
+                return action
+
+        # Every (product, stock, orientation) that could hold the product, in scan order
+        candidates = [
+            candidate
+            for prod_idx, quantity in enumerate(fits.quantity)
+            if quantity > 0  # Only consider products with positive quantity
+            for candidate in self._candidates(prod_idx, index)
+        ]
+        if self.prune:
+            # Most promising first; ties keep the scan order so the same action wins
+            candidates.sort(key=lambda candidate: candidate[:4])
+
+        for visited, (bound, prod_idx, stock_idx, orient, prod_w, prod_h) in enumerate(candidates):
+            if self.prune and best_key is not None and (bound, prod_idx, stock_idx, orient) >= best_key:
+                self.stats.count("candidates_pruned", len(candidates) - visited)
+                break  # Nothing left can beat the best placement
+
+            with self.stats.phase("evaluate"):
+                position, trim_loss = self._best_position(index[stock_idx], prod_w, prod_h)
+
+            # Update the best placement if this is optimal
+            if position is not None and (best_key is None or (trim_loss, prod_idx, stock_idx, orient) < best_key):
+                best_key = (trim_loss, prod_idx, stock_idx, orient)
+                best_placement = {
+                    "stock_idx": stock_idx,
+                    "size": [prod_w, prod_h],
+                    "position": position,
+                }
 
         # Return the best placement found
         if best_placement:
             return best_placement
 
         # If no valid placement is found, return an invalid action
+        self.stats.count("invalid_actions")
         return {"stock_idx": -1, "size": [0, 0], "position": (0, 0)}
         pass
 
     # Student code here
-    # You can add more functions if needed
\ No newline at end of file
+    # You can add more functions if needed
+
+    def _exact_action(self, products, index):
+        """
+        Next action of the exact layout. The layout is searched again when the plan
+        is empty or stale, unless the search already failed in this episode; None
+        sends the caller to the myopic search.
+        """
+        action = self._plan.next_action(products, index)
+        if action is not None:
+            self.stats.count("plan_replays")
+            return action
+        if self._failed_episode == index.episode:
+            return None
+
+        time_limit = None if self.time_limit_ms is None else self.time_limit_ms / 1000
+        self.last_search = BranchAndBound(index, products, self.node_limit, time_limit)
+        with self.stats.phase("search"):
+            try:
+                actions = self.last_search.solve()
+            except RecursionError:
+                actions = None  # Deeper than the interpreter allows; use the myopic choice
+        self.stats.count("nodes", self.last_search.nodes)
+        self.stats.count("transpositions", self.last_search.transpositions)
+        if actions is None:
+            self._failed_episode = index.episode
+            return None
+        self._plan.load(actions, index)
+        return self._plan.next_action(products, index)
+
+    def _candidates(self, prod_idx, index):
+        """
+        (bound, prod_idx, stock_idx, orientation, prod_w, prod_h) for every stock
+        and orientation the product may fit. The bound is the trim loss at the
+        far corner of the stock's free cells, which no placement can beat.
+        """
+        candidates = []
+        fits = self._fits.fits[prod_idx]
+        orientations = self._fits.orientations(prod_idx)
+        for stock_idx, stock in enumerate(index):
+            stock_w, stock_h = stock.width, stock.height
+
+            # Try both orientations of the product
+            for orient, (prod_w, prod_h) in enumerate(orientations):
+                if fits[stock_idx, orient] and stock.can_fit(prod_w, prod_h):
+                    x0, y0, x1, y1 = stock.free_bbox
+                    bound = edge_trim_loss(stock_w, stock_h, prod_w, prod_h, x1 - prod_w, y1 - prod_h)
+                    candidates.append((bound, prod_idx, stock_idx, orient, int(prod_w), int(prod_h)))
+        return candidates
+
+    def _best_position(self, stock, prod_w, prod_h):
+        """Lowest trim loss position of a prod_w x prod_h piece on one indexed stock."""
+        if self.backend == "maxrects":
+            # Only the corners of the free rectangles can be optimal
+            xs, ys = stock.free_rects.candidates(prod_w, prod_h)
+            self.stats.count("positions_scanned", len(xs))
+            trim_loss = edge_trim_loss(stock.width, stock.height, prod_w, prod_h, xs, ys)
+            return first_min_candidate(xs, ys, trim_loss)
+
+        # Check every valid position on the stock in one pass
+        feasible = feasible_positions(stock.grid, (prod_w, prod_h), stock.occupied)
+        self.stats.count("positions_scanned", feasible.size)
+        loss_map = edge_trim_loss(stock.width, stock.height, prod_w, prod_h, *grid_positions(feasible.shape))
+        return first_min_position(feasible, loss_map)
@@ -0,0 +1,153 @@
+import numpy as np
+
+# A chromosome is a 1D array of genes, one fixed-size record per placement
+GENE_DTYPE = np.dtype([
+    ("stock_idx", np.int32),
+    ("w", np.int32),
+    ("h", np.int32),
+    ("x", np.int32),
+    ("y", np.int32),
+    ("rot", np.int8),  # 1 when the piece is placed rotated, as h x w
+    # Run-length block: n pieces of the product cut as a grid cols pieces wide,
+    # filled row by row from (x, y). A single placement is n = cols = 1.
+    ("n", np.int32),
+    ("cols", np.int32),
+    # Area the gene covers if placed on the current stocks, 0 when infeasible.
+    # Derived from the other fields by PopulationScorer.annotate and carried
+    # along by crossover, so unchanged genes are never rechecked.
+    ("used", np.int32),
+])
+
+# The fields that make up the placement itself
+GENE_FIELDS = ["stock_idx", "w", "h", "x", "y", "rot", "n", "cols"]
+
+_GENE_BYTES = np.dtype((np.void, GENE_DTYPE.itemsize))
+
+
+def make_chromosome(genes):
+    """Build a chromosome from (stock_idx, w, h, x, y, rot, n, cols) tuples, with used left at 0."""
+    chromosome = np.zeros(len(genes), dtype=GENE_DTYPE)
+    if len(genes):
+        chromosome[GENE_FIELDS] = genes
+    return chromosome
+
+
+class Chromosome:
+    """
+    Gene array of one solution with its per-stock totals. totals[s] holds the
+    used area and the number of feasible genes on stock s, integers from which
+    fitness follows in O(stocks). Indexing and iteration go to the genes.
+    """
+
+    __slots__ = ("genes", "totals")
+
+    def __init__(self, genes, totals):
+        self.genes = genes
+        self.totals = totals
+
+    def __len__(self):
+        return len(self.genes)
+
+    def __getitem__(self, key):
+        return self.genes[key]
+
+    def __iter__(self):
+        return iter(self.genes)
+
+    def copy(self):
+        return Chromosome(self.genes.copy(), self.totals.copy())
+
+    def replace_gene(self, idx, gene, used):
+        """set_gene with the gene's new used area, moving its share of the totals in O(1)."""
+        old_stock, old_used = int(self.genes["stock_idx"][idx]), int(self.genes["used"][idx])
+        if old_used > 0:
+            self.totals[old_stock, 0] -= old_used
+            self.totals[old_stock, 1] -= 1
+        set_gene(self.genes, idx, gene)
+        self.genes["used"][idx] = used
+        if used > 0:
+            self.totals[gene[0], 0] += used
+            self.totals[gene[0], 1] += 1
+
+
+def stock_totals(genes, n_stocks):
+    """(n_stocks, 2) int64 used area and feasible gene count per stock of an annotated gene array."""
+    # Float bincount weights are exact for integer areas; infeasible genes weigh 0
+    used = np.bincount(genes["stock_idx"], weights=genes["used"], minlength=n_stocks)
+    count = np.bincount(genes["stock_idx"], weights=genes["used"] > 0, minlength=n_stocks)
+    return np.stack((used, count), axis=1).astype(np.int64)
+
+
+def set_gene(chromosome, idx, gene):
+    """Overwrite the placement of one gene with a (stock_idx, w, h, x, y, rot, n, cols) tuple."""
+    chromosome[GENE_FIELDS][idx] = gene
+
+
+def gene_keys(chromosome):
+    """Raw bytes of every gene, usable for vectorized duplicate detection."""
+    return np.ascontiguousarray(chromosome).view(_GENE_BYTES)
+
+
+def crossover(parent1, parent2, crossover_point):
+    """
+    parent1[:crossover_point] followed by the genes of parent2 that are not
+    already in that prefix, keeping parent2's order. The child's totals are
+    rebuilt from its genes.
+    """
+    head = parent1.genes[:crossover_point]
+    tail = parent2.genes[~np.isin(gene_keys(parent2.genes), gene_keys(head))]
+    genes = np.concatenate((head, tail))
+    return Chromosome(genes, stock_totals(genes, len(parent1.totals)))
+
+
+def oriented(size, rot):
+    """(w, h) of a product size as placed with the given orientation gene."""
+    return (size[1], size[0]) if rot else (size[0], size[1])
+
+
+def footprint(genes):
+    """Placed (w, h) arrays of a gene array, read through the orientation gene without copying genes."""
+    rot = genes["rot"] != 0
+    return np.where(rot, genes["h"], genes["w"]), np.where(rot, genes["w"], genes["h"])
+
+
+def block_footprint(genes):
+    """(w, h) arrays of the rectangle every gene covers, the whole block for run-length genes."""
+    prod_w, prod_h = footprint(genes)
+    cols = np.maximum(genes["cols"], 1)
+    return prod_w * cols, prod_h * -(-genes["n"] // cols)
+
+
+def block_size(prod_size, n, cols):
+    """(w, h) of a block of n pieces of prod_size, cols pieces wide."""
+    return prod_size[0] * cols, prod_size[1] * -(-n // cols)
+
+
+def to_action(gene):
+    """Turn a gene into the action dict expected by the environment; the first piece of a block."""
+    return {
+        "stock_idx": int(gene["stock_idx"]),
+        "size": [int(v) for v in oriented((gene["w"], gene["h"]), gene["rot"])],
+        "position": (int(gene["x"]), int(gene["y"])),
+    }
+
+
+def iter_actions(chromosome):
+    """
+    Actions of a chromosome, one piece at a time. Blocks are decoded lazily,
+    so a plan only expands the pieces it actually hands out.
+    """
+    for gene in chromosome:
+        stock_idx, pos_x, pos_y = int(gene["stock_idx"]), int(gene["x"]), int(gene["y"])
+        prod_w, prod_h = (int(v) for v in oriented((gene["w"], gene["h"]), gene["rot"]))
+        cols = max(int(gene["cols"]), 1)
+        for k in range(int(gene["n"])):
+            yield {
+                "stock_idx": stock_idx,
+                "size": [prod_w, prod_h],
+                "position": (pos_x + k % cols * prod_w, pos_y + k // cols * prod_h),
+            }
+
+
+def to_actions(chromosome):
+    return list(iter_actions(chromosome))
@@ -0,0 +1,70 @@
+import numpy as np
+
+
+def size_tuple(size):
+    """Hashable (w, h) of a product or action size."""
+    return int(size[0]), int(size[1])
+
+
+class FitTable:
+    """
+    Product type x stock x orientation fit flags for one episode.
+
+    Products are identified by their position in the products list the table
+    was synced with. Orientation 0 is the product as given, 1 is rotated.
+    fits[prod_id, stock_idx, orient] is the `stock_w >= prod_w and stock_h >= prod_h`
+    test of the policies; it only depends on sizes, so it is computed once per
+    episode and only the quantities are refreshed on every call.
+    """
+
+    def __init__(self):
+        self.episode = None
+        self.sizes = np.zeros((0, 2), dtype=int)
+        self.quantity = np.zeros(0, dtype=int)
+
+    def sync(self, products, index):
+        """Refresh the quantities, rebuilding the table for a new episode or product list; returns self."""
+        sizes = np.array([size_tuple(product["size"]) for product in products], dtype=int).reshape(-1, 2)
+        if self.episode != index.episode or not np.array_equal(sizes, self.sizes):
+            self._build(sizes, index)
+        self.quantity = np.array([product["quantity"] for product in products], dtype=int)
+        return self
+
+    def _build(self, sizes, index):
+        self.episode = index.episode
+        self.sizes = sizes
+        self.product_area = sizes[:, 0] * sizes[:, 1]
+
+        self.stock_size = np.array([(stock.width, stock.height) for stock in index], dtype=int).reshape(-1, 2)
+        self.stock_area = np.array([stock.area for stock in index], dtype=int)
+
+        # (P, 2, 2) footprints: both orientations of every product
+        footprints = np.stack((sizes, sizes[:, ::-1]), axis=1)
+        self.fits = np.all(footprints[:, None, :, :] <= self.stock_size[None, :, None, :], axis=-1)
+
+        # Exact (w, h) -> product ids, for matching action sizes without a scan
+        self.ids = {}
+        for prod_id, size in enumerate(map(tuple, sizes.tolist())):
+            self.ids.setdefault(size, []).append(prod_id)
+
+    def __len__(self):
+        return len(self.sizes)
+
+    def orientations(self, prod_id):
+        """[(prod_w, prod_h), (prod_h, prod_w)], in orientation order."""
+        prod_w, prod_h = self.sizes[prod_id].tolist()
+        return [(prod_w, prod_h), (prod_h, prod_w)]
+
+    def in_demand(self, size):
+        """True when a product of this size, in either orientation, still has quantity left."""
+        prod_w, prod_h = size_tuple(size)
+        prod_ids = self.ids.get((prod_w, prod_h), []) + self.ids.get((prod_h, prod_w), [])
+        return any(self.quantity[prod_id] > 0 for prod_id in prod_ids)
+
+    def fitting_orientations(self, size, stock_idx):
+        """
+        Orientations of a product size that fit a stock, as a list of 0 (as given)
+        and 1 (rotated).
+        """
+        fits = self.fits[self.ids[size_tuple(size)][0], stock_idx]
+        return [orient for orient in (0, 1) if fits[orient]]
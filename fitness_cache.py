@@ -0,0 +1,50 @@
+from collections import OrderedDict
+import hashlib
+
+
+def chromosome_key(chromosome):
+    """Cheap hash of a chromosome's genes, stable across processes and runs."""
+    return hashlib.blake2b(chromosome.tobytes(), digest_size=8).digest()
+
+
+class FitnessCache:
+    """
+    Bounded LRU map from chromosome key to fitness.
+
+    Fitness only depends on the genes and the stocks, so the cache must be
+    cleared whenever the stocks change between get_action calls.
+    """
+
+    def __init__(self, maxsize=4096):
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+
+    def __len__(self):
+        return len(self._entries)
+
+    @property
+    def hit_rate(self):
+        lookups = self.hits + self.misses
+        return self.hits / lookups if lookups else 0.0
+
+    def get(self, key):
+        """Return the cached fitness for key, or None on a miss."""
+        fitness = self._entries.get(key)
+        if fitness is None:
+            self.misses += 1
+            return None
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return fitness
+
+    def put(self, key, fitness):
+        self._entries[key] = fitness
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+
+    def clear(self):
+        """Drop every entry; the counters keep running."""
+        self._entries.clear()
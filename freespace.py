@@ -0,0 +1,100 @@
+import numpy as np
+
+
+def blocked_rects(mask):
+    """
+    Cover the True cells of a 2D mask with disjoint rectangles (x, y, w, h):
+    runs along y are extended over x for as long as the next line repeats them.
+    """
+    rects = []
+    open_runs = {}  # (y, h) -> x where the rectangle started
+    for x in range(mask.shape[0] + 1):
+        runs = set()
+        if x < mask.shape[0]:
+            line = np.concatenate(([False], mask[x], [False]))
+            edges = np.flatnonzero(line[1:] != line[:-1])
+            runs = {(int(start), int(stop - start)) for start, stop in zip(edges[::2], edges[1::2])}
+        for run in list(open_runs):
+            if run not in runs:
+                start = open_runs.pop(run)
+                rects.append((start, run[0], x - start, run[1]))
+        for run in runs:
+            open_runs.setdefault(run, x)
+    return rects
+
+
+class MaxRects:
+    """
+    Free space of one stock as its list of maximal free rectangles (x, y, w, h).
+
+    Every free position of a piece lies inside one maximal rectangle, so the
+    corners of the rectangles that are large enough are the only candidates a
+    policy needs to score when its score is monotone (or bilinear) in x and y.
+    Cutting a piece splits the rectangles it overlaps, so the work per update
+    and per query grows with the number of placed pieces, not the stock area.
+    """
+
+    def __init__(self, width, height):
+        self.rects = [(0, 0, width, height)] if width > 0 and height > 0 else []
+
+    @classmethod
+    def from_grid(cls, grid, width, height):
+        """Free rectangles of the usable width x height corner of a stock grid."""
+        free_space = cls(width, height)
+        for rect in blocked_rects(grid[:width, :height] != -1):
+            free_space.place(*rect)
+        return free_space
+
+    def __len__(self):
+        return len(self.rects)
+
+    def place(self, x, y, w, h):
+        """Remove the rectangle (x, y, w, h) from the free space."""
+        split = []
+        for fx, fy, fw, fh in self.rects:
+            if x >= fx + fw or x + w <= fx or y >= fy + fh or y + h <= fy:
+                split.append((fx, fy, fw, fh))
+                continue
+            # Keep the up to four maximal strips of the free rectangle around the cut
+            if x > fx:
+                split.append((fx, fy, x - fx, fh))
+            if x + w < fx + fw:
+                split.append((x + w, fy, fx + fw - x - w, fh))
+            if y > fy:
+                split.append((fx, fy, fw, y - fy))
+            if y + h < fy + fh:
+                split.append((fx, y + h, fw, fy + fh - y - h))
+        self.rects = _maximal(split)
+
+    def occupy(self, mask, x0=0, y0=0):
+        """Remove every True cell of a cut mask whose [0, 0] sits at (x0, y0) on the stock."""
+        for x, y, w, h in blocked_rects(mask):
+            self.place(x0 + x, y0 + y, w, h)
+
+    def candidates(self, prod_w, prod_h):
+        """Corner positions (xs, ys) of every free rectangle a prod_w x prod_h piece fits in."""
+        if not self.rects:
+            return np.empty(0, dtype=int), np.empty(0, dtype=int)
+        rects = np.array(self.rects)
+        rects = rects[(rects[:, 2] >= prod_w) & (rects[:, 3] >= prod_h)]
+        low_x, low_y = rects[:, 0], rects[:, 1]
+        high_x, high_y = low_x + rects[:, 2] - prod_w, low_y + rects[:, 3] - prod_h
+        xs = np.concatenate((low_x, high_x, low_x, high_x))
+        ys = np.concatenate((low_y, low_y, high_y, high_y))
+        return xs, ys
+
+
+def _maximal(rects):
+    """Drop duplicate rectangles and those contained in another one."""
+    if len(rects) < 2:
+        return rects
+    r = np.unique(np.array(rects), axis=0)
+    x0, y0 = r[:, 0], r[:, 1]
+    x1, y1 = x0 + r[:, 2], y0 + r[:, 3]
+    # contained[i, j]: rectangle i lies inside rectangle j
+    contained = (
+        (x0[:, None] >= x0[None, :]) & (y0[:, None] >= y0[None, :])
+        & (x1[:, None] <= x1[None, :]) & (y1[:, None] <= y1[None, :])
+    )
+    np.fill_diagonal(contained, False)
+    return [tuple(int(v) for v in rect) for rect in r[~contained.any(axis=1)]]
@@ -0,0 +1,86 @@
+import numpy as np
+
+from chromosome import Chromosome, block_footprint, block_size, stock_totals
+from placement import summed_area_table
+
+# Scores are rounded to this many decimals, so that layouts of equal fitness tie
+# exactly whatever order their terms were summed in
+SCORE_DECIMALS = 9
+
+
+class PopulationScorer:
+    """
+    Scores whole GA populations against the current stocks with array operations.
+
+    Built once per get_action from the occupancy index: the usable area of every
+    stock and a stacked summed-area table of occupied cells, padded so cells
+    outside a stock count as occupied.
+    """
+
+    def __init__(self, index):
+        self.version = index.version
+        self.areas = np.array([stock.area for stock in index], dtype=float)
+
+        max_w = max(stock.grid.shape[0] for stock in index)
+        max_h = max(stock.grid.shape[1] for stock in index)
+        blocked = np.ones((len(index), max_w, max_h), dtype=bool)
+        for stock_idx, stock in enumerate(index):
+            blocked[stock_idx, :stock.grid.shape[0], :stock.grid.shape[1]] = stock.grid != -1
+        self.occupied = np.stack([summed_area_table(grid) for grid in blocked])
+
+    def feasible(self, genes):
+        """
+        Vectorized _can_place_ of every gene of a gene array against the unmodified
+        stocks; a block gene is feasible when its whole rectangle is free.
+        """
+        stock_idx = genes["stock_idx"]
+        prod_w, prod_h = block_footprint(genes)
+        x0, y0 = genes["x"], genes["y"]
+        x1, y1 = x0 + prod_w, y0 + prod_h
+        max_x, max_y = self.occupied.shape[1] - 1, self.occupied.shape[2] - 1
+        inside = (
+            (prod_w > 0) & (prod_h > 0)
+            & (x0 >= 0) & (y0 >= 0) & (x1 <= max_x) & (y1 <= max_y)
+        )
+
+        x0, x1 = np.clip(x0, 0, max_x), np.clip(x1, 0, max_x)
+        y0, y1 = np.clip(y0, 0, max_y), np.clip(y1, 0, max_y)
+        occ = self.occupied
+        blocked = occ[stock_idx, x1, y1] - occ[stock_idx, x0, y1] - occ[stock_idx, x1, y0] + occ[stock_idx, x0, y0]
+        return inside & (blocked == 0)
+
+    def annotate(self, genes):
+        """
+        Store in genes["used"] the area each gene covers on the current stocks, 0 if
+        infeasible, and return the genes as a Chromosome with their totals.
+        """
+        genes["used"] = np.where(self.feasible(genes), genes["w"].astype(np.int64) * genes["h"] * genes["n"], 0)
+        return Chromosome(genes, stock_totals(genes, len(self.areas)))
+
+    def placed_area(self, stock_idx, pos_x, pos_y, prod_w, prod_h, n=1, cols=1):
+        """Scalar annotate() of one placed block of n pieces: their area if it is free on the stock, else 0."""
+        block_w, block_h = block_size((prod_w, prod_h), n, cols)
+        max_x, max_y = self.occupied.shape[1] - 1, self.occupied.shape[2] - 1
+        if block_w <= 0 or block_h <= 0 or pos_x < 0 or pos_y < 0 or pos_x + block_w > max_x or pos_y + block_h > max_y:
+            return 0
+        occ = self.occupied[stock_idx]
+        x1, y1 = pos_x + block_w, pos_y + block_h
+        if occ[x1, y1] - occ[pos_x, y1] - occ[x1, pos_y] + occ[pos_x, pos_y]:
+            return 0
+        return n * prod_w * prod_h
+
+    def score(self, totals):
+        """
+        Fitness of every row of a (P, S, 2) stack of chromosome totals, the same
+        quantity as _evaluate_fitness: summed trim loss of the placed genes, 0.5
+        per used stock, minus utilization. The trim losses of the n_s genes on a
+        stock sum to n_s - U_s / A_s, so only the per-stock used area U_s and
+        gene count n_s are read and a chromosome scores in O(stocks). Scores are
+        rounded to SCORE_DECIMALS, so equal fitnesses compare equal and sorting
+        a population never depends on the summation order.
+        """
+        used_area, n_genes = totals[..., 0], totals[..., 1]
+        utilization = used_area / self.areas
+        trim_loss = n_genes.sum(axis=1) - utilization.sum(axis=1)
+        penalty = (used_area > 0).sum(axis=1) * 0.5
+        return np.round(trim_loss + penalty - utilization.sum(axis=1), SCORE_DECIMALS)
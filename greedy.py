@@ -1,13 +1,55 @@
 from policy import Policy
+from background import BackgroundPlanner
+from placement import corner_waste, feasible_positions, first_min_candidate, first_min_position, grid_positions
+from fit_table import FitTable
+from pattern_library import PatternLibrary, PatternReplay
+from plan import CuttingPlan
+from stats import PolicyStats
+from stock_index import OccupancyIndex
+import copy
+import time
 
 
 class Policy2210xxx(Policy):
-    def __init__(self, policy_id=1):
+    def __init__(self, policy_id=1, backend="grid", batch_size=1, prune=True, stats=False, stats_log=None,
+                 background=False, background_horizon=None,
+                 pattern_library=None, pattern_library_size=1024):
         """
         Initializes the custom policy with a specific ID.
+        backend picks how candidate positions are found: "grid" scans every cell
+        of the stock, "maxrects" only scores corners of the maximal free rectangles.
+        With batch_size > 1, one call plans up to that many placements ahead and
+        later calls serve them while the observation matches.
+        prune visits the stocks by a lower bound on their waste and stops once no
+        remaining stock can win; the chosen action is the same as without it.
+        stats turns on the counters and phase timers of self.stats; with stats_log,
+        the stats of every episode are appended to that file as a JSON line.
+        With background, a worker thread keeps solving ahead of the environment
+        (up to background_horizon actions per state) and get_action serves its
+        actions while they stay valid; see background.BackgroundPlanner.
+        With pattern_library, the path of a JSON file, whole-stock cutting patterns
+        are remembered across episodes and replayed before searching when an uncut
+        stock and the remaining demand match one; the file keeps at most
+        pattern_library_size patterns, dropping the least recently used.
         """
         assert policy_id in [1, 2], "Policy ID must be 1 or 2"
+        assert backend in ["grid", "maxrects"], "Backend must be grid or maxrects"
+        assert batch_size >= 1, "Batch size must be at least 1"
         self.policy_id = policy_id  # Store the policy ID for later use
+        self.backend = backend
+        self.batch_size = batch_size
+        self.prune = prune
+        # Per-stock occupancy kept across calls
+        self._index = OccupancyIndex(track_free_rects=backend == "maxrects")
+        self._queue = CuttingPlan()  # Placements computed ahead by the last batch
+        self._fits = FitTable()  # Product x stock x orientation fit flags of the episode
+        self.stats = PolicyStats(stats, stats_log)
+        self._patterns = None
+        if pattern_library is not None:
+            self._patterns = PatternReplay(PatternLibrary(pattern_library, pattern_library_size), self._index)
+        self._background = None
+        if background:
+            self._background = BackgroundPlanner(self, self._lookup_or_solve, background_horizon)
 
         # Student code here
         if policy_id == 1:
@@ -19,52 +61,163 @@ class Policy2210xxx(Policy):
         """
         Implements an optimized greedy policy to minimize trim loss.
         """
+        if self._background is not None:
+            return self._background.get_action(observation, info)
+        return self._lookup_or_solve(observation, info)
+
+    def _lookup_or_solve(self, observation, info):
+        """Replay a stored pattern if one matches, else solve."""
+        if self._patterns is None:
+            return self._solve(observation, info)
+        return self._patterns.get_action(observation, info, self._solve)
+
+    def close(self):
+        """Stop the background planner, save the pattern library and log the last episode's stats."""
+        if self._background is not None:
+            self._background.close()
+        if self._patterns is not None:
+            self._patterns.flush()
+        self.stats.end_episode()
+
+    def _solve(self, observation, info):
+        """One synchronous greedy choice on the observation."""
         print(f"Running optimized Policy2210xxx with ID: {self.policy_id}")
 
-        # Sort products by descending area
-        list_prods = sorted(
-            observation["products"],
-            key=lambda prod: prod["size"][0] * prod["size"][1],
-            reverse=True,
-        )
+        # Bring the per-stock occupancy index up to date with the last cut
+        tick = time.perf_counter()
+        index = self._index.sync(observation["stocks"], observation["products"])
+        self.stats.start_call(index.episode)
 
-        for prod in list_prods:
-            if prod["quantity"] > 0:  # Only consider products with positive quantity
-                prod_size = prod["size"]
+        # Serve the queued batch while the environment follows it
+        action = self._queue.next_action(observation["products"], index)
+        if action is not None:
+            self.stats.count("plan_replays")
+            self.stats.add_time("init", time.perf_counter() - tick)
+            return action
 
-                # Try to place the product in the best-fit stock
-                best_placement = None
-                min_waste = float("inf")  # Initialize the minimum waste
-
-                for stock_idx, stock in enumerate(observation["stocks"]):
-                    stock_w, stock_h = self._get_stock_size_(stock)
-
-                    for orientation in [(prod_size[0], prod_size[1]), (prod_size[1], prod_size[0])]:
-                        prod_w, prod_h = orientation
-                        if stock_w >= prod_w and stock_h >= prod_h:
-                            for x in range(stock_w - prod_w + 1):
-                                for y in range(stock_h - prod_h + 1):
-                                    if self._can_place_(stock, (x, y), (prod_w, prod_h)):
-                                        # Calculate the waste if placed here
-                                        remaining_w = stock_w - (x + prod_w)
-                                        remaining_h = stock_h - (y + prod_h)
-                                        waste = remaining_w * remaining_h
-
-                                        # Update the best placement if this is more optimal
-                                        if waste < min_waste:
-                                            min_waste = waste
-                                            best_placement = {
-                                                "stock_idx": stock_idx,
-                                                "size": [prod_w, prod_h],
-                                                "position": (x, y),
-                                            }
+        fits = self._fits.sync(observation["products"], index)
+        self.stats.add_time("init", time.perf_counter() - tick)
 
-                if best_placement:
-                    return best_placement
+        # Sort product ids by descending area
+        order = sorted(range(len(fits)), key=lambda prod_id: fits.product_area[prod_id], reverse=True)
+
+        if self.batch_size > 1:
+            self._queue.load(self._plan_batch(order, index), index)
+            action = self._queue.next_action(observation["products"], index)
+        else:
+            _, action = self._select(order, fits.quantity.tolist(), index, {})
+        if action is not None:
+            return action
 
         # If no valid placement is found, return an invalid action
+        self.stats.count("invalid_actions")
         return {"stock_idx": -1, "size": [0, 0], "position": (0, 0)}
         pass
 
     # Student code here
-    # You can add more functions if needed
\ No newline at end of file
+    # You can add more functions if needed
+
+    def _select(self, order, quantities, index, best_on_stock):
+        """
+        Greedy choice: the largest product still in demand, at the lowest-waste
+        position over every stock and orientation. Returns (prod_id, placement),
+        or (None, None) when nothing fits. best_on_stock memoizes the best
+        position per (stock_idx, prod_w, prod_h) and stock version.
+        """
+        for prod_id in order:
+            if quantities[prod_id] > 0:  # Only consider products with positive quantity
+                candidates = self._candidates(prod_id, index)
+                if self.prune:
+                    # Most promising stocks first; ties keep the scan order
+                    candidates.sort(key=lambda candidate: candidate[:3])
+
+                # Try to place the product in the best-fit stock
+                best_placement = None
+                best_key = None  # (waste, stock, orientation) of the best placement
+
+                for visited, (bound, stock_idx, orient, prod_w, prod_h) in enumerate(candidates):
+                    if self.prune and best_key is not None and (bound, stock_idx, orient) >= best_key:
+                        self.stats.count("candidates_pruned", len(candidates) - visited)
+                        break  # No remaining stock can beat the best placement
+
+                    stock = index[stock_idx]
+                    key = (stock_idx, prod_w, prod_h)
+                    if key not in best_on_stock or best_on_stock[key][0] != stock.version:
+                        with self.stats.phase("evaluate"):
+                            best_on_stock[key] = (stock.version, self._best_position(stock, prod_w, prod_h))
+                    else:
+                        self.stats.count("cache_hits")
+                    position, waste = best_on_stock[key][1]
+
+                    # Update the best placement if this is more optimal
+                    if position is not None and (best_key is None or (waste, stock_idx, orient) < best_key):
+                        best_key = (waste, stock_idx, orient)
+                        best_placement = {
+                            "stock_idx": stock_idx,
+                            "size": [prod_w, prod_h],
+                            "position": position,
+                        }
+
+                if best_placement:
+                    return prod_id, best_placement
+        return None, None
+
+    def _candidates(self, prod_id, index):
+        """
+        (bound, stock_idx, orientation, prod_w, prod_h) for every stock and
+        orientation the product may fit, in scan order. The bound is the waste at
+        the far corner of the stock's free cells, which no placement can beat.
+        """
+        candidates = []
+        fits = self._fits.fits[prod_id]
+        orientations = self._fits.orientations(prod_id)
+        for stock_idx, stock in enumerate(index):
+            stock_w, stock_h = stock.width, stock.height
+
+            for orient, (prod_w, prod_h) in enumerate(orientations):
+                if fits[stock_idx, orient] and stock.can_fit(prod_w, prod_h):
+                    x0, y0, x1, y1 = stock.free_bbox
+                    bound = corner_waste(stock_w, stock_h, prod_w, prod_h, x1 - prod_w, y1 - prod_h)
+                    candidates.append((bound, stock_idx, orient, int(prod_w), int(prod_h)))
+        return candidates
+
+    def _best_position(self, stock, prod_w, prod_h):
+        """Lowest-waste position of a prod_w x prod_h piece on one indexed stock."""
+        if self.backend == "maxrects":
+            # Corners of the free rectangles, scored by the waste if placed there
+            xs, ys = stock.free_rects.candidates(prod_w, prod_h)
+            self.stats.count("positions_scanned", len(xs))
+            waste = corner_waste(stock.width, stock.height, prod_w, prod_h, xs, ys)
+            return first_min_candidate(xs, ys, waste)
+
+        # Every feasible position at once, scored by the waste if placed there
+        feasible = feasible_positions(stock.grid, (prod_w, prod_h), stock.occupied)
+        self.stats.count("positions_scanned", feasible.size)
+        waste_map = corner_waste(stock.width, stock.height, prod_w, prod_h, *grid_positions(feasible.shape))
+        return first_min_position(feasible, waste_map)
+
+    def _plan_batch(self, order, index):
+        """
+        Run the greedy choice batch_size times on a scratch copy of the index,
+        cutting each pick from the copy. Only the stock that was cut gets
+        rescanned between picks, so one scan of the other stocks serves the
+        whole batch.
+        """
+        scratch = copy.deepcopy(index)
+        quantities = self._fits.quantity.tolist()
+        best_on_stock = {}
+        batch = []
+        while len(batch) < self.batch_size:
+            prod_id, placement = self._select(order, quantities, scratch, best_on_stock)
+            if placement is None:
+                break
+            batch.append(placement)
+
+            # Cut the piece from the scratch stock and use up one unit of the product
+            stock = scratch[placement["stock_idx"]]
+            (pos_x, pos_y), (prod_w, prod_h) = placement["position"], placement["size"]
+            grid = stock.grid.copy()
+            grid[pos_x:pos_x + prod_w, pos_y:pos_y + prod_h] = -3  # Reserved by the batch
+            stock.update(grid)
+            quantities[prod_id] -= 1
+        return batch
@@ -0,0 +1,176 @@
+import argparse
+import json
+import struct
+import sys
+
+import numpy as np
+
+from local_env import CuttingStockEnv
+
+# File layout: magic, header length, JSON header padded to ALIGN bytes, then every
+# array as raw little-endian C-order data starting on an ALIGN boundary. The
+# header records the dtype, shape and offset of each array, so any of them can
+# be opened with np.memmap without reading the others.
+MAGIC = b"CSI\x01"
+ALIGN = 64
+
+
+def _aligned(n):
+    return -(-n // ALIGN) * ALIGN
+
+
+def write_arrays(path, arrays, meta=None):
+    """Write named arrays and a JSON-friendly meta dict to one binary file."""
+    arrays = {name: np.ascontiguousarray(array, dtype=np.asarray(array).dtype.newbyteorder("<"))
+              for name, array in arrays.items()}
+    layout = {}
+    offset = 0
+    for name, array in arrays.items():
+        layout[name] = {"dtype": array.dtype.str, "shape": list(array.shape), "offset": offset}
+        offset = _aligned(offset + array.nbytes)
+
+    header = json.dumps({"meta": meta or {}, "arrays": layout}).encode()
+    prefix = _aligned(len(MAGIC) + 4 + len(header))
+    header = header.ljust(prefix - len(MAGIC) - 4)
+    with open(path, "wb") as file:
+        file.write(MAGIC + struct.pack("<I", len(header)) + header)
+        for name, array in arrays.items():
+            file.seek(prefix + layout[name]["offset"])
+            file.write(array.tobytes())
+        file.truncate(prefix + offset)
+
+
+def read_arrays(path, mmap=True):
+    """
+    Returns (arrays, meta) of a file written by write_arrays. With mmap the arrays
+    are read-only np.memmap views of the file, so nothing is read until used.
+    """
+    with open(path, "rb") as file:
+        if file.read(len(MAGIC)) != MAGIC:
+            raise ValueError(f"{path} is not a cutting-stock binary file")
+        (length,) = struct.unpack("<I", file.read(4))
+        header = json.loads(file.read(length))
+        prefix = len(MAGIC) + 4 + length
+
+        arrays = {}
+        for name, spec in header["arrays"].items():
+            dtype, shape = np.dtype(spec["dtype"]), tuple(spec["shape"])
+            if mmap and int(np.prod(shape)) > 0:
+                arrays[name] = np.memmap(path, dtype=dtype, mode="r", offset=prefix + spec["offset"], shape=shape)
+            else:
+                file.seek(prefix + spec["offset"])
+                arrays[name] = np.fromfile(file, dtype=dtype, count=int(np.prod(shape))).reshape(shape)
+    return arrays, header["meta"]
+
+
+def initial_grids(instance):
+    """(S, max_w, max_h) int32 block of the stocks of an instance before any cut."""
+    max_w, max_h = instance.get("max_w", 100), instance.get("max_h", 100)
+    grids = np.full((len(instance["stocks"]), max_w, max_h), -2, dtype=np.int32)
+    for stock_idx, (stock_w, stock_h) in enumerate(instance["stocks"]):
+        grids[stock_idx, :stock_w, :stock_h] = -1
+    return grids
+
+
+def save_instance(path, instance, grids=None):
+    """
+    Write an instance dict, and its stock grids as one contiguous block. grids
+    defaults to the uncut stocks; pass a partly cut block to store a mid-episode state.
+    """
+    stocks = np.array(instance["stocks"], dtype=np.int32).reshape(-1, 2)
+    products = np.array(
+        [(product["size"][0], product["size"][1], product["quantity"]) for product in instance["products"]],
+        dtype=np.int32,
+    ).reshape(-1, 3)
+    meta = {key: value for key, value in instance.items() if key not in ("stocks", "products", "grids")}
+    write_arrays(path, {
+        "stocks": stocks,
+        "products": products,
+        "grids": initial_grids(instance) if grids is None else grids,
+    }, meta)
+
+
+def load_instance(path, mmap=True):
+    """
+    Read an instance written by save_instance. The result is an instance dict as
+    used by local_env, with "grids" holding the memory-mapped stock block.
+    """
+    arrays, meta = read_arrays(path, mmap)
+    instance = dict(meta)
+    instance["stocks"] = arrays["stocks"].tolist()
+    instance["products"] = [
+        {"size": [int(prod_w), int(prod_h)], "quantity": int(quantity)}
+        for prod_w, prod_h, quantity in arrays["products"]
+    ]
+    instance["grids"] = arrays["grids"]
+    return instance
+
+
+def save_solution(path, actions, meta=None):
+    """Write a placement list as an (N, 5) int32 array of stock_idx, w, h, x, y."""
+    placements = np.array(
+        [(action["stock_idx"], *action["size"], *action["position"]) for action in actions],
+        dtype=np.int32,
+    ).reshape(-1, 5)
+    write_arrays(path, {"placements": placements}, meta)
+
+
+def load_solution(path):
+    """Returns (actions, meta) of a solution written by save_solution."""
+    arrays, meta = read_arrays(path, mmap=False)
+    actions = [
+        {"stock_idx": int(stock_idx), "size": [int(prod_w), int(prod_h)], "position": (int(pos_x), int(pos_y))}
+        for stock_idx, prod_w, prod_h, pos_x, pos_y in arrays["placements"]
+    ]
+    return actions, meta
+
+
+def verify_solution(instance, actions):
+    """
+    Replay actions on a fresh environment of the instance. The solution is valid
+    when every action is accepted, i.e. places one piece. Returns a report with
+    the index of the first rejected action, if any, and the final env metrics.
+    """
+    env = CuttingStockEnv(instance)
+    observation, info = env.reset()
+    terminated = False
+    first_invalid = None
+    for i, action in enumerate(actions):
+        remaining = sum(product["quantity"] for product in observation["products"])
+        observation, reward, terminated, truncated, info = env.step(action)
+        if sum(product["quantity"] for product in observation["products"]) == remaining and first_invalid is None:
+            first_invalid = i
+    return {
+        "valid": first_invalid is None,
+        "first_invalid": first_invalid,
+        "actions": len(actions),
+        "completed": bool(terminated),
+        "filled_ratio": info["filled_ratio"],
+        "trim_loss": info["trim_loss"],
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Pack instances into the binary format and verify solutions.")
+    commands = parser.add_subparsers(dest="command", required=True)
+    pack = commands.add_parser("pack", help="convert a JSON instance to the binary format")
+    pack.add_argument("instance")
+    pack.add_argument("output")
+    verify = commands.add_parser("verify", help="replay a solution on its instance")
+    verify.add_argument("instance")
+    verify.add_argument("solution")
+    args = parser.parse_args(argv)
+
+    if args.command == "pack":
+        with open(args.instance) as file:
+            save_instance(args.output, json.load(file))
+    else:
+        actions, _ = load_solution(args.solution)
+        report = verify_solution(load_instance(args.instance), actions)
+        json.dump(report, sys.stdout)
+        sys.stdout.write("\n")
+        sys.exit(0 if report["valid"] else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,103 @@
+import numpy as np
+
+
+def generate_instance(seed, n_stocks=10, stock_size=(50, 100), n_products=10,
+                      product_size=(5, 30), quantity=(1, 10), max_w=100, max_h=100):
+    """
+    Seeded random instance as a JSON-friendly dict.
+    Every *_size and quantity argument is an inclusive (low, high) range.
+    """
+    rng = np.random.default_rng(seed)
+    low, high = stock_size
+    stocks = [
+        [int(rng.integers(low, min(high, max_w) + 1)), int(rng.integers(low, min(high, max_h) + 1))]
+        for _ in range(n_stocks)
+    ]
+
+    low, high = product_size
+    products = [
+        {
+            "size": [int(rng.integers(low, high + 1)), int(rng.integers(low, high + 1))],
+            "quantity": int(rng.integers(quantity[0], quantity[1] + 1)),
+        }
+        for _ in range(n_products)
+    ]
+    return {"seed": seed, "max_w": max_w, "max_h": max_h, "stocks": stocks, "products": products}
+
+
+class CuttingStockEnv:
+    """
+    Offline stand-in for the cutting-stock gym environment, built from an instance dict.
+
+    It follows the rules of the course environment: stocks are max_w x max_h int
+    grids with -2 outside the stock, -1 for free cells and the product index for
+    cut cells; an action is accepted when a product of that size (in either
+    orientation) is still in demand and the rectangle is free. An instance
+    with "grids" (see instance_io) starts from those stock arrays.
+    """
+
+    def __init__(self, instance):
+        self.instance = instance
+        self.max_w = instance.get("max_w", 100)
+        self.max_h = instance.get("max_h", 100)
+        self.reset()
+
+    def reset(self):
+        self._stocks = []
+        if "grids" in self.instance:
+            # Stored, possibly partly cut, stock block; copied since steps cut in place
+            self._stocks = [np.array(grid, dtype=int) for grid in self.instance["grids"]]
+        else:
+            for stock_w, stock_h in self.instance["stocks"]:
+                stock = np.full((self.max_w, self.max_h), -2, dtype=int)
+                stock[:stock_w, :stock_h] = -1
+                self._stocks.append(stock)
+        self._stocks = tuple(self._stocks)
+        self._products = tuple(
+            {"size": np.array(product["size"]), "quantity": int(product["quantity"])}
+            for product in self.instance["products"]
+        )
+        self.cutted_stocks = np.zeros(len(self._stocks), dtype=int)
+        return self._get_obs(), self._get_info()
+
+    def step(self, action):
+        stock_idx = action["stock_idx"]
+        width, height = int(action["size"][0]), int(action["size"][1])
+        x, y = int(action["position"][0]), int(action["position"][1])
+
+        product_idx = None
+        for i, product in enumerate(self._products):
+            if product["quantity"] == 0:
+                continue
+            if np.array_equal(product["size"], (width, height)) or np.array_equal(product["size"], (height, width)):
+                product_idx = i
+                break
+
+        if product_idx is not None and 0 <= stock_idx < len(self._stocks):
+            stock = self._stocks[stock_idx]
+            stock_w = np.sum(np.any(stock != -2, axis=1))
+            stock_h = np.sum(np.any(stock != -2, axis=0))
+            if x >= 0 and y >= 0 and x + width <= stock_w and y + height <= stock_h:
+                if np.all(stock[x:x + width, y:y + height] == -1):
+                    self.cutted_stocks[stock_idx] = 1
+                    stock[x:x + width, y:y + height] = product_idx
+                    self._products[product_idx]["quantity"] -= 1
+
+        terminated = all(product["quantity"] == 0 for product in self._products)
+        reward = 1 if terminated else 0
+        return self._get_obs(), reward, terminated, False, self._get_info()
+
+    def _get_obs(self):
+        return {"stocks": self._stocks, "products": self._products}
+
+    def _get_info(self):
+        filled_ratio = float(np.mean(self.cutted_stocks))
+        trim_loss = [
+            np.sum(stock == -1) / np.sum(stock != -2)
+            for stock_idx, stock in enumerate(self._stocks)
+            if self.cutted_stocks[stock_idx]
+        ]
+        return {
+            "filled_ratio": filled_ratio,
+            "trim_loss": float(np.mean(trim_loss)) if trim_loss else 1.0,
+        }
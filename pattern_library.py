@@ -0,0 +1,262 @@
+import json
+import os
+import tempfile
+import threading
+from collections import OrderedDict
+
+import numpy as np
+
+from plan import CuttingPlan, size_key
+
+# Stocks filled less than this at the end of an episode are not worth remembering
+MIN_UTILIZATION = 0.75
+
+
+def _multiset(pieces):
+    """Orientation-free product-size multiset of a pattern, as sorted (size_key, count) pairs."""
+    counts = {}
+    for prod_w, prod_h, _, _ in pieces:
+        key = size_key((prod_w, prod_h))
+        counts[key] = counts.get(key, 0) + 1
+    return tuple(sorted(counts.items()))
+
+
+def is_valid_pattern(stock_size, pieces):
+    """True when every piece lies inside the stock and no two pieces overlap."""
+    stock_w, stock_h = stock_size
+    covered = np.zeros((stock_w, stock_h), dtype=bool)
+    for prod_w, prod_h, pos_x, pos_y in pieces:
+        if prod_w <= 0 or prod_h <= 0 or pos_x < 0 or pos_y < 0 or pos_x + prod_w > stock_w or pos_y + prod_h > stock_h:
+            return False
+        region = covered[pos_x:pos_x + prod_w, pos_y:pos_y + prod_h]
+        if region.any():
+            return False
+        region[:] = True
+    return True
+
+
+class PatternLibrary:
+    """
+    Cutting patterns of whole stocks, reused across episodes.
+
+    A pattern is the list of (w, h, x, y) pieces cut from one uncut stock, keyed
+    by the stock size and the multiset of its product sizes; a key keeps its best
+    utilization. Patterns with pieces outside the stock or overlapping each
+    other are refused, also when loading. With path, the library is loaded from
+    and saved to that JSON file. At most max_patterns are kept, the least recently used going first.
+    The library is a shared store: copies of a policy use the same one.
+
+    Saving first merges in the patterns other processes wrote to the file since,
+    so workers sharing one path keep each other's patterns. A pattern written by
+    another process between that merge and the replace can still be lost.
+    """
+
+    def __init__(self, path=None, max_patterns=1024):
+        self.path = path
+        self.max_patterns = max_patterns
+        self.patterns = OrderedDict()  # (stock_w, stock_h, multiset) -> pattern, least recently used first
+        self._lock = threading.Lock()
+        self._save_lock = threading.Lock()  # Held for a whole save, so saves never interleave
+        self._dirty = False
+        if path is not None and os.path.exists(path):
+            self.load()
+
+    def __deepcopy__(self, memo):
+        return self
+
+    def __len__(self):
+        return len(self.patterns)
+
+    def load(self):
+        entries = self._read()
+        with self._lock:
+            self.patterns.clear()
+            self._merge(entries)
+
+    def save(self):
+        """
+        Write the library to its file if it changed, replacing the file atomically,
+        after merging in the patterns the file holds.
+        """
+        with self._save_lock:
+            if self.path is None or not self._dirty:
+                return
+            entries = self._read() if os.path.exists(self.path) else []
+            with self._lock:
+                self._merge(entries)
+                entries = [
+                    {"stock": list(pattern["stock"]), "pieces": [list(piece) for piece in pattern["pieces"]],
+                     "utilization": pattern["utilization"]}
+                    for pattern in self.patterns.values()
+                ]
+                self._dirty = False
+            directory, name = os.path.split(os.path.abspath(self.path))
+            fd, temp_path = tempfile.mkstemp(prefix=name + ".", suffix=".tmp", dir=directory)
+            try:
+                with os.fdopen(fd, "w") as file:
+                    json.dump({"patterns": entries}, file)
+                os.replace(temp_path, self.path)
+            except BaseException:
+                os.remove(temp_path)
+                raise
+
+    def add(self, stock_size, pieces, utilization):
+        """Store a pattern unless it is invalid or its key already has one at least as good."""
+        stock_size = (int(stock_size[0]), int(stock_size[1]))
+        pieces = [tuple(int(v) for v in piece) for piece in pieces]
+        if utilization > 1 or not is_valid_pattern(stock_size, pieces):
+            return
+        key = (*stock_size, _multiset(pieces))
+        with self._lock:
+            known = self.patterns.get(key)
+            if known is not None and known["utilization"] >= utilization:
+                self.patterns.move_to_end(key)
+                return
+            self.patterns[key] = {"stock": stock_size, "pieces": pieces, "utilization": utilization}
+            self.patterns.move_to_end(key)
+            self._evict()
+            self._dirty = True
+
+    def lookup(self, stock_size, demand):
+        """
+        Best-utilization pattern for a stock size whose pieces are all still in
+        demand, a {size_key: quantity} dict, or None.
+        """
+        best_key = None
+        with self._lock:
+            for key, pattern in self.patterns.items():
+                if key[:2] != stock_size or (best_key is not None and
+                                             pattern["utilization"] <= self.patterns[best_key]["utilization"]):
+                    continue
+                if all(demand.get(size, 0) >= count for size, count in key[2]):
+                    best_key = key
+            if best_key is None:
+                return None
+            self.patterns.move_to_end(best_key)
+            return self.patterns[best_key]
+
+    def _read(self):
+        with open(self.path) as file:
+            return json.load(file)["patterns"]
+
+    def _merge(self, entries):
+        """
+        Add the valid file entries whose key is unknown or better than the one
+        kept; called with the lock held. New keys count as least recently used.
+        """
+        added = []
+        for entry in entries:
+            pieces = [tuple(piece) for piece in entry["pieces"]]
+            if not is_valid_pattern(entry["stock"], pieces) or entry["utilization"] > 1:
+                self._dirty = True  # Written back without it on the next save
+                continue
+            key = (*entry["stock"], _multiset(pieces))
+            known = self.patterns.get(key)
+            if known is not None and known["utilization"] >= entry["utilization"]:
+                continue
+            if known is None:
+                added.append(key)
+            self.patterns[key] = {"stock": tuple(entry["stock"]), "pieces": pieces, "utilization": entry["utilization"]}
+        for key in reversed(added):
+            self.patterns.move_to_end(key, last=False)
+        self._evict()
+
+    def _evict(self):
+        while len(self.patterns) > self.max_patterns:
+            self.patterns.popitem(last=False)
+            self._dirty = True
+
+
+class PatternReplay:
+    """
+    Per-policy front end of a PatternLibrary.
+
+    get_action first replays a stored pattern on an uncut stock whose size and
+    product mix match the remaining demand, and only calls the policy's own
+    search on a miss. Every action handed out is also recorded; when the episode
+    ends, the stocks that were cut from uncut are added to the library. A new
+    episode is one the index starts, i.e. on a reset or when a product
+    quantity goes up; a stock seen uncut again also restarts its record.
+    """
+
+    def __init__(self, library, index, min_utilization=MIN_UTILIZATION):
+        self.library = library
+        self.index = index  # The policy's OccupancyIndex, synced here first
+        self.min_utilization = min_utilization
+        self._plan = CuttingPlan()
+        self._episode = None
+        self._pieces = {}  # stock_idx -> pieces cut since the stock was uncut, None if it never was
+
+    def get_action(self, observation, info, solve):
+        products = observation["products"]
+        index = self.index.sync(observation["stocks"], products)
+        if index.episode != self._episode:
+            self.flush()
+            self._episode = index.episode
+
+        action = self._plan.next_action(products, index)
+        if action is None:
+            actions = self._match(products, index)
+            if actions:
+                self._plan.load(actions, index)
+                action = self._plan.next_action(products, index)
+        if action is None:
+            action = solve(observation, info)
+        self._record(action, products, index)
+        return action
+
+    def flush(self):
+        """Add the recorded stocks of the episode to the library and save it."""
+        for stock_size, pieces in self._pieces.values():
+            if not pieces:
+                continue
+            utilization = sum(prod_w * prod_h for prod_w, prod_h, _, _ in pieces) / (stock_size[0] * stock_size[1])
+            if utilization >= self.min_utilization:
+                self.library.add(stock_size, pieces, utilization)
+        self._pieces = {}
+        self.library.save()
+
+    def _match(self, products, index):
+        """Actions of the best stored pattern for any uncut stock, or None."""
+        demand = {}
+        for product in products:
+            key = size_key(product["size"])
+            demand[key] = demand.get(key, 0) + product["quantity"]
+
+        best = None
+        seen = set()
+        for stock_idx, stock in enumerate(index):
+            stock_size = (stock.width, stock.height)
+            if stock.free_area != stock.area or stock_size in seen:
+                continue
+            seen.add(stock_size)
+            pattern = self.library.lookup(stock_size, demand)
+            if pattern is not None and (best is None or pattern["utilization"] > best[1]["utilization"]):
+                best = (stock_idx, pattern)
+        if best is None:
+            return None
+        stock_idx, pattern = best
+        return [
+            {"stock_idx": stock_idx, "size": [prod_w, prod_h], "position": (pos_x, pos_y)}
+            for prod_w, prod_h, pos_x, pos_y in pattern["pieces"]
+        ]
+
+    def _record(self, action, products, index):
+        """Remember an action if the environment will accept it, i.e. it is valid now."""
+        stock_idx = action["stock_idx"]
+        if not 0 <= stock_idx < len(index):
+            return
+        prod_w, prod_h = int(action["size"][0]), int(action["size"][1])
+        pos_x, pos_y = int(action["position"][0]), int(action["position"][1])
+        in_demand = any(
+            size_key(product["size"]) == size_key((prod_w, prod_h)) and product["quantity"] > 0
+            for product in products
+        )
+        stock = index[stock_idx]
+        if not in_demand or not stock.can_place((pos_x, pos_y), (prod_w, prod_h)):
+            return
+        if stock_idx not in self._pieces or stock.free_area == stock.area:
+            self._pieces[stock_idx] = ((stock.width, stock.height), [] if stock.free_area == stock.area else None)
+        pieces = self._pieces[stock_idx][1]
+        if pieces is not None:
+            pieces.append((prod_w, prod_h, pos_x, pos_y))
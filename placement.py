@@ -0,0 +1,88 @@
+import numpy as np
+
+
+def summed_area_table(mask):
+    """
+    Returns the (W + 1, H + 1) summed-area table of a 2D mask.
+    """
+    sat = np.zeros((mask.shape[0] + 1, mask.shape[1] + 1), dtype=np.int32)
+    np.cumsum(np.cumsum(mask, axis=0, dtype=np.int32), axis=1, out=sat[1:, 1:])
+    return sat
+
+
+def window_sums(sat, prod_w, prod_h):
+    """
+    Sum of the mask over every prod_w x prod_h window, indexed by its top-left corner.
+    """
+    return sat[prod_w:, prod_h:] - sat[:-prod_w, prod_h:] - sat[prod_w:, :-prod_h] + sat[:-prod_w, :-prod_h]
+
+
+def occupied_table(stock):
+    """Summed-area table of the cells of a stock that cannot be cut (anything but -1)."""
+    return summed_area_table(stock != -1)
+
+
+def feasible_positions(stock, prod_size, occupied=None):
+    """
+    Boolean map of every top-left (x, y) where a prod_size rectangle fits on the stock.
+
+    Entry [x, y] is True exactly when self._can_place_(stock, (x, y), prod_size) is,
+    for every position that keeps the rectangle inside the stock array.
+    """
+    prod_w, prod_h = int(prod_size[0]), int(prod_size[1])
+    if occupied is None:
+        occupied = occupied_table(stock)
+    if prod_w <= 0 or prod_h <= 0 or prod_w >= occupied.shape[0] or prod_h >= occupied.shape[1]:
+        return np.zeros((max(occupied.shape[0] - prod_w, 0), max(occupied.shape[1] - prod_h, 0)), dtype=bool)
+    return window_sums(occupied, prod_w, prod_h) == 0
+
+
+def first_free_position(stock, prod_size, occupied=None):
+    """First (x, y) in x-then-y scan order where a prod_size rectangle fits on the stock, or None."""
+    feasible = feasible_positions(stock, prod_size, occupied)
+    if not feasible.any():
+        return None
+    pos_x, pos_y = np.unravel_index(int(np.argmax(feasible)), feasible.shape)
+    return int(pos_x), int(pos_y)
+
+
+def first_min_position(feasible, score):
+    """
+    Returns ((x, y), value) of the first feasible minimum of score, scanning x then y,
+    which is the position a nested `for x: for y: if score < best` loop would keep.
+    Returns (None, inf) when nothing is feasible.
+    """
+    if not feasible.any():
+        return None, float("inf")
+    masked = np.where(feasible, score, np.inf)
+    flat = int(np.argmin(masked))
+    pos_x, pos_y = np.unravel_index(flat, masked.shape)
+    return (int(pos_x), int(pos_y)), masked.flat[flat]
+
+
+def first_min_candidate(xs, ys, score):
+    """
+    Returns ((x, y), value) of the candidate with the lowest score, ties going to
+    the smallest x then y as in first_min_position. Returns (None, inf) when empty.
+    """
+    if len(xs) == 0:
+        return None, float("inf")
+    best = np.lexsort((ys, xs, score))[0]
+    return (int(xs[best]), int(ys[best])), score[best]
+
+
+def grid_positions(shape):
+    """Broadcastable x and y coordinates of every cell of a feasibility map."""
+    return np.arange(shape[0])[:, None], np.arange(shape[1])[None, :]
+
+
+def corner_waste(stock_w, stock_h, prod_w, prod_h, pos_x, pos_y):
+    """Greedy waste (stock_w - x - prod_w) * (stock_h - y - prod_h) at the given positions."""
+    return (stock_w - prod_w - pos_x) * (stock_h - prod_h - pos_y)
+
+
+def edge_trim_loss(stock_w, stock_h, prod_w, prod_h, pos_x, pos_y):
+    """Brute-force trim loss remaining_w * stock_h + remaining_h * stock_w - remaining_w * remaining_h."""
+    remaining_w = stock_w - prod_w - pos_x
+    remaining_h = stock_h - prod_h - pos_y
+    return remaining_w * stock_h + remaining_h * stock_w - remaining_w * remaining_h
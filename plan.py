@@ -0,0 +1,157 @@
+import numpy as np
+
+from chromosome import block_size, oriented
+from placement import first_free_position
+
+
+def size_key(size):
+    """Orientation-free key of a product size, matching how the environment accepts actions."""
+    return tuple(sorted((int(size[0]), int(size[1]))))
+
+
+def expand_demand(products):
+    """One entry per remaining piece, so a solution can cover the whole demand."""
+    return [product for product in products for _ in range(product["quantity"])]
+
+
+def _remaining_demand(products):
+    remaining = {}
+    for product in products:
+        key = size_key(product["size"])
+        remaining[key] = remaining.get(key, 0) + product["quantity"]
+    return remaining
+
+
+def feasible_sequence(solution, products, index):
+    """
+    Actions of a solution that can be applied one after the other on the indexed
+    stocks, in order. A gene that collides with an earlier one is moved to the
+    first free position of its stock, then of any stock; genes of exhausted
+    products, or that fit nowhere, are dropped.
+    """
+    remaining = _remaining_demand(products)
+    grids = {}
+    sequence = []
+    for action in solution:
+        prod_w, prod_h = int(action["size"][0]), int(action["size"][1])
+        key = size_key((prod_w, prod_h))
+        if remaining.get(key, 0) <= 0:
+            continue
+
+        placed = _reserve(grids, index, action["stock_idx"], action["position"], (prod_w, prod_h))
+        if placed is None:
+            continue
+        remaining[key] -= 1
+        sequence.append({"stock_idx": placed[0], "size": action["size"], "position": placed[1]})
+    return sequence
+
+
+def feasible_blocks(solution, products, index):
+    """
+    feasible_sequence of a run-length chromosome, block by block: every block is
+    cut down to the remaining demand of its product, then placed whole, moved
+    like a single gene when it collides. Returns the kept genes; decode them
+    with chromosome.iter_actions.
+    """
+    remaining = _remaining_demand(products)
+    grids = {}
+    blocks = []
+    for gene in solution:
+        key = size_key((gene["w"], gene["h"]))
+        n = min(int(gene["n"]), remaining.get(key, 0))
+        if n <= 0:
+            continue
+
+        cols = min(max(int(gene["cols"]), 1), n)
+        size = block_size(oriented((int(gene["w"]), int(gene["h"])), gene["rot"]), n, cols)
+        placed = _reserve(grids, index, int(gene["stock_idx"]), (gene["x"], gene["y"]), size)
+        if placed is None:
+            continue
+        remaining[key] -= n
+        block = gene.copy()
+        block["stock_idx"], (block["x"], block["y"]) = placed
+        block["n"], block["cols"] = n, cols
+        blocks.append(block)
+    return blocks
+
+
+def _reserve(grids, index, stock_idx, position, size):
+    """
+    Reserve a size rectangle on the scratch grids, at position on stock_idx if it
+    is free there, else at the first free position of that stock, then of any
+    other. Returns (stock_idx, position) of the reservation, or None.
+    """
+    position = (int(position[0]), int(position[1]))
+    candidates = [stock_idx] + [i for i in range(len(index)) if i != stock_idx]
+    for candidate in candidates:
+        if candidate not in grids:
+            grids[candidate] = index[candidate].grid.copy()
+        grid = grids[candidate]
+        if candidate != stock_idx or not _is_free(grid, position, size):
+            position = first_free_position(grid, size)
+        if position is not None:
+            pos_x, pos_y = position
+            grid[pos_x:pos_x + size[0], pos_y:pos_y + size[1]] = -3  # Reserved by the plan
+            return candidate, position
+    return None
+
+
+def _is_free(grid, position, size):
+    pos_x, pos_y = position
+    region = grid[pos_x:pos_x + size[0], pos_y:pos_y + size[1]]
+    return region.shape == tuple(size) and np.all(region == -1)
+
+
+class CuttingPlan:
+    """
+    Placement sequence solved once and handed out one action per get_action call.
+
+    The plan remembers the free area it expects on every stock; as soon as the
+    observation stops matching (another cut, an episode reset, a product running
+    out) it is dropped so the policy can replan.
+
+    The actions may come from any iterable, e.g. a lazy decoder of block genes;
+    it is only advanced one action ahead of the environment.
+    """
+
+    def __init__(self):
+        self._actions = iter(())
+        self._head = None
+        self._episode = None
+        self._expected_free = None
+
+    def clear(self):
+        self._actions = iter(())
+        self._head = None
+        self._expected_free = None
+
+    def load(self, actions, index):
+        """Cache a new plan computed against the current state of the index."""
+        self._actions = iter(actions)
+        self._head = next(self._actions, None)
+        self._episode = index.episode
+        self._expected_free = [stock.free_area for stock in index]
+
+    def next_action(self, products, index):
+        """Pop the next planned action, or return None when the plan is empty or stale."""
+        if self._head is None:
+            return None
+        if index.episode != self._episode or [stock.free_area for stock in index] != self._expected_free:
+            self.clear()
+            return None
+
+        action = self._head
+        stock = index[action["stock_idx"]]
+        prod_w, prod_h = int(action["size"][0]), int(action["size"][1])
+        pos_x, pos_y = int(action["position"][0]), int(action["position"][1])
+        product_left = any(
+            size_key(product["size"]) == size_key((prod_w, prod_h)) and product["quantity"] > 0
+            for product in products
+        )
+        if not product_left or not stock.can_place((pos_x, pos_y), (prod_w, prod_h)):
+            self.clear()
+            return None
+
+        self._head = next(self._actions, None)
+        self._expected_free[action["stock_idx"]] -= prod_w * prod_h
+        return action
@@ -0,0 +1,96 @@
+import contextlib
+import json
+import time
+
+_DISABLED = contextlib.nullcontext()
+
+
+class PolicyStats:
+    """
+    Opt-in counters and phase timers of one policy.
+
+    When disabled, count() returns at once and phase() hands back a shared
+    no-op context manager, so the hooks can stay in the hot paths. Stats are
+    kept per episode; with log_path, every finished episode is appended to
+    that file as one JSON line.
+    """
+
+    def __init__(self, enabled=False, log_path=None):
+        self.enabled = enabled
+        self.log_path = log_path
+        self.episode = None
+        self.reset()
+
+    def reset(self):
+        self.calls = 0
+        self.counters = {}
+        self.timers = {}
+
+    def count(self, name, n=1):
+        if self.enabled:
+            self.counters[name] = self.counters.get(name, 0) + int(n)
+
+    def add_time(self, name, seconds):
+        if self.enabled:
+            self.timers[name] = self.timers.get(name, 0.0) + seconds
+
+    def phase(self, name):
+        """Context manager adding the time spent in the block to the name timer."""
+        if not self.enabled:
+            return _DISABLED
+        return _PhaseTimer(self.timers, name)
+
+    def start_call(self, episode):
+        """Called once per get_action with the index episode; closes the previous episode on a reset."""
+        if not self.enabled:
+            return
+        if episode != self.episode:
+            if self.calls:
+                self.end_episode()
+            self.episode = episode
+        self.calls += 1
+
+    def merge(self, snapshot):
+        """Add the counters and timers of another snapshot, e.g. from a worker process."""
+        for name, n in snapshot["counters"].items():
+            self.counters[name] = self.counters.get(name, 0) + int(n)
+        for name, seconds in snapshot["timers_s"].items():
+            self.timers[name] = self.timers.get(name, 0.0) + seconds
+
+    def snapshot(self):
+        return {
+            "episode": self.episode,
+            "calls": self.calls,
+            "counters": dict(self.counters),
+            "timers_s": dict(self.timers),
+        }
+
+    def take(self):
+        """Snapshot and reset."""
+        snapshot = self.snapshot()
+        self.reset()
+        return snapshot
+
+    def end_episode(self):
+        """Log the current episode, if any, and start counting a new one. Returns its snapshot."""
+        snapshot = self.take()
+        if self.enabled and snapshot["calls"] and self.log_path is not None:
+            with open(self.log_path, "a") as log:
+                log.write(json.dumps(snapshot) + "\n")
+        return snapshot
+
+
+class _PhaseTimer:
+    __slots__ = ("timers", "name", "start")
+
+    def __init__(self, timers, name):
+        self.timers = timers
+        self.name = name
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.timers[self.name] = self.timers.get(self.name, 0.0) + time.perf_counter() - self.start
+        return False
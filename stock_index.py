@@ -0,0 +1,176 @@
+import numpy as np
+
+from bitset import StockBitset
+from freespace import MaxRects
+from placement import summed_area_table
+
+
+def longest_run(mask, axis):
+    """
+    Length of the longest run of True cells along axis, for every line of the other axis.
+    """
+    mask = np.moveaxis(mask, axis, -1)
+    steps = np.arange(1, mask.shape[-1] + 1)
+    # Index just past the last blocked cell seen so far on each line
+    last_blocked = np.maximum.accumulate(np.where(mask, 0, steps), axis=-1)
+    runs = np.where(mask, steps - last_blocked, 0)
+    return runs.max(axis=-1, initial=0)
+
+
+class StockIndex:
+    """
+    Occupancy summary of one stock, updated in place as pieces are cut from it.
+    With track_free_rects it also maintains the stock's maximal free rectangles.
+    """
+
+    def __init__(self, stock, track_free_rects=False):
+        self.version = 0
+        self.track_free_rects = track_free_rects
+        self.rebuild(stock)
+
+    def rebuild(self, stock):
+        """Recompute everything from the raw stock array."""
+        self.grid = np.array(stock, copy=True)
+        usable = self.grid != -2
+        free = self.grid == -1
+
+        self.width = int(np.sum(np.any(usable, axis=1)))
+        self.height = int(np.sum(np.any(usable, axis=0)))
+        self.area = int(np.sum(usable))  # Usable area, the np.sum(stock != -2) of the policies
+        self.free_area = int(np.sum(free))
+        self.occupied = summed_area_table(~free)
+
+        # Longest free run along x for every y, and along y for every x
+        self.run_w = longest_run(free, axis=0)
+        self.run_h = longest_run(free, axis=1)
+        self.free_bbox = self._free_bbox()
+        self.bits = StockBitset(free)
+
+        self.free_rects = None
+        if self.track_free_rects:
+            self.free_rects = MaxRects.from_grid(self.grid, self.width, self.height)
+        self.version += 1
+
+    def update(self, stock):
+        """
+        Apply the cells cut since the last sync.
+        Returns False when the stock did not just lose free cells and must be rebuilt.
+        """
+        if stock.shape != self.grid.shape:
+            return False
+        changed = stock != self.grid
+        if not changed.any():
+            return True
+
+        # Within an episode cells only ever go from free to cut
+        if np.any(self.grid[changed] != -1) or np.any(stock[changed] == -2):
+            return False
+
+        xs = np.flatnonzero(changed.any(axis=1))
+        ys = np.flatnonzero(changed.any(axis=0))
+        x0, x1 = xs[0], xs[-1] + 1
+        y0, y1 = ys[0], ys[-1] + 1
+
+        self.grid[x0:x1, y0:y1] = stock[x0:x1, y0:y1]
+        self.free_area -= int(np.sum(changed[x0:x1, y0:y1]))
+        self.occupied[x0 + 1:, y0 + 1:] += summed_area_table(changed[x0:, y0:])[1:, 1:]
+
+        # Only the lines crossing the cut can lose their longest run
+        free = self.grid == -1
+        self.run_w[y0:y1] = longest_run(free[:, y0:y1], axis=0)
+        self.run_h[x0:x1] = longest_run(free[x0:x1, :], axis=1)
+        self.free_bbox = self._free_bbox()
+        self.bits.update(free, y0, y1)
+        if self.free_rects is not None:
+            self.free_rects.occupy(changed[x0:x1, y0:y1], x0, y0)
+        self.version += 1
+        return True
+
+    def can_place(self, position, prod_size):
+        """Bitset version of Policy._can_place_ on the indexed stock."""
+        return self.bits.fits(int(position[0]), int(position[1]), int(prod_size[0]), int(prod_size[1]))
+
+    def _free_bbox(self):
+        """(x0, y0, x1, y1) bounding box of the free cells, or None for a full stock."""
+        xs = np.flatnonzero(self.run_h)
+        ys = np.flatnonzero(self.run_w)
+        if len(xs) == 0:
+            return None
+        return int(xs[0]), int(ys[0]), int(xs[-1]) + 1, int(ys[-1]) + 1
+
+    @property
+    def largest_free_rect(self):
+        """Upper bound on the area of any free rectangle of the stock."""
+        return min(self.free_area, int(self.run_w.max(initial=0)) * int(self.run_h.max(initial=0)))
+
+    def can_fit(self, prod_w, prod_h):
+        """Cheap necessary condition for a prod_w x prod_h rectangle to fit somewhere."""
+        return (
+            prod_w * prod_h <= self.free_area
+            and prod_w <= self.run_w.max(initial=0)
+            and prod_h <= self.run_h.max(initial=0)
+        )
+
+
+class OccupancyIndex:
+    """
+    StockIndex of every stock in the observation, kept across get_action calls.
+
+    sync() diffs the incoming stocks against the previous observation and only
+    touches the cells that were cut; a stock is rebuilt when the episode resets.
+    The policy never sees the last observation of an episode, so a new order on
+    stocks that look like the last ones seen is only told apart by its demand:
+    given the products, sync() also starts a new episode when a quantity goes up.
+    """
+
+    def __init__(self, track_free_rects=False):
+        self.track_free_rects = track_free_rects
+        self.stocks = []
+        self.episode = 0
+        self.version = 0
+        self._demand = None  # [(w, h, quantity)] of the last synced products
+
+    def sync(self, stocks, products=None):
+        """Bring the index up to date with observation["stocks"] and return it."""
+        new_order = False
+        if products is not None:
+            demand = [(int(p["size"][0]), int(p["size"][1]), int(p["quantity"])) for p in products]
+            new_order = self._demand is not None and _demand_increased(self._demand, demand)
+            self._demand = demand
+
+        if len(stocks) != len(self.stocks):
+            self.stocks = [StockIndex(stock, self.track_free_rects) for stock in stocks]
+            self.episode += 1
+            self.version += 1
+            return self
+
+        reset = new_order
+        for index, stock in zip(self.stocks, stocks):
+            version = index.version
+            if not index.update(stock):
+                index.rebuild(stock)
+                reset = True
+            if index.version != version:
+                self.version += 1
+        if reset:
+            self.episode += 1
+        return self
+
+    def __len__(self):
+        return len(self.stocks)
+
+    def __getitem__(self, stock_idx):
+        return self.stocks[stock_idx]
+
+    def __iter__(self):
+        return iter(self.stocks)
+
+
+def _demand_increased(old, new):
+    """True when new is not old with some quantities used up, i.e. a new order."""
+    if len(old) != len(new):
+        return True
+    return any(
+        (old_w, old_h) != (new_w, new_h) or new_q > old_q
+        for (old_w, old_h, old_q), (new_w, new_h, new_q) in zip(old, new)
+    )